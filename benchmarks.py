@@ -0,0 +1,166 @@
+import os
+import sys
+import random
+import timeit
+import tempfile
+import subprocess
+import tracemalloc
+import music_data as md
+import music_objects as mo
+import music_methods as mm
+import fretboard
+import song_search
+
+"""
+File Name: benchmarks.py
+Description: Microbenchmarks for the hot paths in music_data, music_objects and music_methods.
+             Run with `python benchmarks.py`.
+"""
+
+
+def report(label, seconds, number):
+    print(f"{label:<40} {seconds / number * 1e6:8.3f} us/call")
+
+
+def scan_note_values(note):
+    # the note_values linear scan that note_to_integer replaced
+    for i, values in enumerate(md.note_values):
+        if note in values:
+            return i
+    return None
+
+
+def bench_note_lookup(number = 200000):
+    notes = [note for row in md.note_values for note in row if note is not None]
+    rounds = number // len(notes)
+    number = rounds * len(notes)
+    scan = timeit.timeit(lambda: [scan_note_values(note) for note in notes], number=rounds)
+    table = timeit.timeit(lambda: [md.note_to_integer.get(note) for note in notes], number=rounds)
+
+    print("note name -> pitch class")
+    report("  note_values scan", scan, number)
+    report("  note_to_integer lookup", table, number)
+    print(f"  speedup: {scan / table:.1f}x")
+
+
+startup_script = """
+import time
+start = time.perf_counter()
+import music_methods
+imported = time.perf_counter()
+music_methods.find_spelling_from_name('m7')
+music_methods.find_coords_from_spelling([0, 4, 7])
+print(imported - start, time.perf_counter() - imported)
+"""
+
+def run_startup(cache, runs = 5):
+    # best of several fresh interpreters, started outside the repo to check path handling
+    env = dict(os.environ, PYTHONPATH=md.data_dir, MUSIC_DATA_CACHE='1' if cache else '0')
+    best = None
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cwd:
+            out = subprocess.run([sys.executable, '-c', startup_script], cwd=cwd, env=env,
+                                 capture_output=True, text=True, check=True).stdout
+        times = tuple(float(t) for t in out.split())
+        best = times if best is None or sum(times) < sum(best) else best
+    return best
+
+def bench_startup():
+    # warm the pickle cache first so the cached run measures a cache hit
+    run_startup(True, runs=1)
+    print("startup (fresh interpreter)")
+    for label, cache in (("json", False), ("pickle cache", True)):
+        imported, first_use = run_startup(cache)
+        print(f"  {label:<14} import {imported * 1000:7.1f} ms   first lookup {first_use * 1000:7.1f} ms")
+
+
+def traced_size(build):
+    # bytes still allocated by build()'s result
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(result), size
+
+def bench_memory():
+    # every voicing of every generic shape spelling on all 12 roots
+    mm.build_shape_index()
+    voicings = [[shape.root] + list(shape.coords) for mask in mm.shape_index for root in range(12)
+                for shape in mm.find_voicings(md.mask_to_spelling(mask), root)[2]]
+
+    # the shared templates already exist once find_voicings has run
+    templates = [mo.ShapeTemplate.from_coords(coords) for coords in voicings]
+
+    print("memory for all voicings on all roots")
+    for label, build in (("ChordShape", lambda: [mo.ChordShape(list(coords)) for coords in voicings]),
+                         ("CompactChordShape", lambda: [mo.CompactChordShape(coords[0], tuple(coords[1:])) for coords in voicings]),
+                         ("PlacedShape", lambda: [templates[i].place(coords[coords[0]]) for i, coords in enumerate(voicings)])):
+        count, size = traced_size(build)
+        print(f"  {label:<18} {count} shapes {size / 1024:9.1f} KiB  {size / count:7.1f} B/shape")
+
+
+def bench_batch(number = 5):
+    if fretboard.np is None:
+        print("shape analysis: numpy not installed, skipping")
+        return
+    coords = [list(entry['coords']) for entry in md.generic_shapes['shapes']]
+    per_object = timeit.timeit(lambda: [mo.ChordShape(list(row)) for row in coords], number=number)
+    batch = timeit.timeit(lambda: fretboard.analyze_shapes(coords), number=number)
+
+    print(f"analyze {len(coords)} generic shapes")
+    report("  ChordShape per shape", per_object, number * len(coords))
+    report("  fretboard.analyze_shapes", batch, number * len(coords))
+    print(f"  speedup: {per_object / batch:.1f}x")
+
+
+def bench_scale_grids(number = 2000):
+    names = list(md.scale_map)
+    fretboards = mo.ScaleFretboards().build_all()
+    per_call = timeit.timeit(lambda: [mo.Scale.create_coords2(list(md.scale_map[name])) for name in names], number=number // 100)
+    cached = timeit.timeit(lambda: [fretboards.coords(name, 'E') for name in names], number=number // 100)
+    grids = timeit.timeit(lambda: [fretboards.grid(name, 'E') for name in names], number=number // 100)
+
+    print(f"fretboard grids for {len(names)} scales")
+    report("  Scale.create_coords2", per_call, number // 100 * len(names))
+    report("  ScaleFretboards.coords", cached, number // 100 * len(names))
+    report("  ScaleFretboards.grid", grids, number // 100 * len(names))
+    print(f"  speedup: {per_call / cached:.1f}x coords, {per_call / grids:.1f}x grid")
+
+
+def bench_enumerate():
+    masks = sorted({md.spelling_to_mask(entry['spelling']) for entry in md.names_to_spellings['chords']})
+    mm.search_voicings.cache_clear()
+    seconds = timeit.timeit(lambda: [mm.search_voicings(mask, 3, 3, mm.neck_frets, 4, True) for mask in masks], number=1)
+
+    print(f"enumerate voicings for {len(masks)} spellings on C, whole neck")
+    report("  search_voicings (uncached)", seconds, len(masks))
+
+
+def bench_song_search(sizes = (10000, 100000), queries = 200):
+    # random catalogs of three word titles, searched by prefix, substring and one typo
+    rng = random.Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = [''.join(rng.choices(letters, k=rng.randint(3, 9))) for _ in range(30000)]
+    typo = lambda word: word[:1] + word[2] + word[1] + word[3:]
+    searches = [(label, [make(rng.choice(words)) for _ in range(queries)]) for label, make in
+                (("two letters", lambda word: word[:2]), ("prefix", lambda word: word[:4]), 
+                 ("substring", lambda word: word[1:]), ("typo", typo))]
+
+    print("song search by catalog size")
+    for size in sizes:
+        index = song_search.SongIndex()
+        for song_id in range(size):
+            index.add(song_id, " ".join(rng.choices(words, k=3)), rng.choice(words[:5000]))
+        for label, batch in searches:
+            seconds = timeit.timeit(lambda: [index.search(query) for query in batch], number=1)
+            report(f"  {size} songs, {label}", seconds, len(batch))
+
+
+if __name__ == "__main__":
+    bench_note_lookup()
+    bench_startup()
+    bench_memory()
+    bench_batch()
+    bench_scale_grids()
+    bench_enumerate()
+    bench_song_search()
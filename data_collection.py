@@ -195,6 +195,8 @@ def parse_specific_shapes(shape_file, spelling_file, new_shape_file):
         
                 #each shape has a root note coord (1-6) & a 6-digit coords list 
         generic_shapes = {'shapes': []}
+        # spelling masks already in the spellings json, so each check is one lookup
+        known_masks = {md.spelling_to_mask(entry['spelling']) for entry in spellings['chords']}
         i = 1 
         for shape in specific_shapes['chords']:
             root_note = md.get_note_from_chord(shape['names'][0])
@@ -215,15 +217,10 @@ def parse_specific_shapes(shape_file, spelling_file, new_shape_file):
             print(str(i) + ": " + generic_names[0], shape_obj.chord.name, shape_obj.spelling, shape_obj.root)
             
             #check if current chord's spelling is already in spellings json 
-            found = False
-            for entry in spellings['chords']:
-                spelling = entry['spelling']
-                
-                if set(spelling) == shape_obj.spelling:
-                    found = True
-                    break
+            found = shape_obj.mask in known_masks
             
             spellings['chords'].append({'names': generic_names, 'spelling': sorted(list(shape_obj.spelling))})
+            known_masks.add(shape_obj.mask)
 
             if(i < 0 ): 
                 break 
@@ -8,7 +8,6 @@ from werkzeug.security import check_password_hash, generate_password_hash
 from sqlalchemy import text
 
 import music_methods as mm
-import music_objects as mo
 import music_data as md
 
 DATABASE_USERNAME = ""
@@ -30,35 +29,25 @@ def add_diagrams():
     i = 0 
     for row in rows:
         #get diagram for chord name
-        chord_name = md.transpose_chord(row[1], 0)
-        note = md.get_note_from_chord(chord_name)
-        generic_name = md.get_generic_chord_name(chord_name)
+        chord_name = row[1]
+        parsed = md.parse_chord(chord_name)
+        note = parsed.root if parsed else None
+        generic_name = parsed.generic_name if parsed else None
         spelling = mm.find_spelling_from_name(generic_name)
-        coords = mm.find_coords_from_spelling(spelling)
+        voicings = mm.find_voicings(spelling, note)[2]
         
         # no diagram 
-        if coords is None: 
+        if not voicings: 
             query = text("UPDATE chord SET diagram = NULL WHERE chord_id = :chord_id")
             conn.execute(query, chord_id=row[0])
             return 0
 
-        k = 0 
-        while True:
-            shape_obj = mo.ChordShape(coords, note) 
-            if shape_obj.diagram.min_fret >= fret_range[0] and shape_obj.diagram.max_fret <= fret_range[1]:
-                diagram = shape_obj.diagram.diagram
-                print(chord_name, generic_name)
-                pprint.pprint(diagram)
-                insert_diagram(row[0], diagram)
-                break 
-            elif k > 15: 
-                diagram = shape_obj.diagram.diagram
-                print(chord_name, generic_name)
-                pprint.pprint(diagram)
-                insert_diagram(row[0], diagram)
-                break
-            coords = mm.find_coords_from_spelling(spelling)
-            k += 1
+        # best voicing in range, or the lowest one if none fits
+        shape_obj = mm.find_voicing_in_range(spelling, note, fret_range) or voicings[0]
+        diagram = shape_obj.diagram.diagram
+        print(chord_name, generic_name)
+        pprint.pprint(diagram)
+        insert_diagram(row[0], diagram)
 
         if i > 5: break
         i += 1
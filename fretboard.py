@@ -0,0 +1,81 @@
+from collections import namedtuple
+import music_data as md
+import music_objects as mo
+
+try:
+    import numpy as np
+except ImportError:  # optional, only needed for the batch functions below
+    np = None
+
+"""
+File Name: fretboard.py
+Description: Vectorized fretboard computations for analyzing many chord shapes at once, for
+             offline jobs like data_collection.parse_specific_shapes and db_methods.add_diagrams.
+             Results match ChordShape one shape at a time. Requires numpy (pip install numpy).
+"""
+
+ShapeBatch = namedtuple('ShapeBatch', ['notes', 'masks', 'root_strings', 'roots', 'min_frets', 'max_frets', 'valid'])
+ShapeBatch.__doc__ = """
+Per-shape arrays returned by analyze_shapes, one row per input shape:
+    notes (N, strings): pitch class of each string (A = 0), -1 for muted strings (ChordShape.notes)
+    masks (N,): 12-bit spelling mask relative to the root string (ChordShape.mask)
+    root_strings (N,): root string 1-6, found like process_coords when given as 0 (ChordShape.root)
+    roots (N,): pitch class of the root string
+    min_frets, max_frets (N,): lowest and highest played coord (ChordShape.diagram.min_fret/max_fret)
+    valid (N,): False for shapes with no played strings or a muted root string
+"""
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("fretboard needs numpy for batch shape analysis: pip install numpy")
+
+
+def analyze_shapes(coords, base_notes = None):
+    """
+    Analyzes an (N, strings + 1) array of [root string, fret 1, ..., fret 6] coords (0 = muted,
+    1 = open, the ChordShape format) in a few vectorized operations.
+
+    Parameters:
+        coords (array-like of int): The shapes, shape (N, strings + 1).
+        base_notes (list of int or Tuning): Open string notes, defaults to standard tuning.
+
+    Returns:
+        ShapeBatch: Arrays of notes, spelling masks, roots and fret spans.
+    """
+    require_numpy()
+    if base_notes is None or isinstance(base_notes, (str, mo.Tuning)):
+        base_notes = mo.get_tuning(base_notes).base_notes
+    base = np.asarray(base_notes, dtype=np.int16)
+    coords = np.asarray(coords, dtype=np.int16).reshape(-1, len(base) + 1)
+    frets = coords[:, 1:]
+    played = frets != 0
+
+    notes = np.where(played, (frets + base - 1) % 12, -1)
+
+    # root string: given, or the first played string like ChordShape.process_coords
+    first_played = np.where(played.any(axis=1), played.argmax(axis=1) + 1, 0)
+    root_strings = np.where(coords[:, 0] != 0, coords[:, 0], first_played)
+    rows = np.arange(len(coords))
+    roots = notes[rows, np.clip(root_strings - 1, 0, len(base) - 1)]
+    valid = (root_strings != 0) & (roots >= 0)
+
+    intervals = (notes - roots[:, None]) % 12
+    bits = np.where(played, np.left_shift(1, intervals), 0)
+    masks = np.bitwise_or.reduce(bits, axis=1).astype(np.uint16)
+
+    min_frets = np.where(played, frets, np.iinfo(np.int16).max).min(axis=1)
+    max_frets = frets.max(axis=1)
+    min_frets = np.where(played.any(axis=1), min_frets, 0)
+
+    return ShapeBatch(notes, np.where(valid, masks, 0).astype(np.uint16), root_strings, roots,
+                      min_frets, max_frets, valid)
+
+
+def spelling_matches(batch, spelling):
+    """
+    Boolean array of the shapes in batch whose spelling equals spelling (a mask or tones).
+    """
+    require_numpy()
+    mask = spelling if isinstance(spelling, int) else md.spelling_to_mask(spelling)
+    return batch.valid & (batch.masks == mask)
@@ -1,5 +1,5 @@
 # Mapping from standard to integer, including double sharps and flats
-import pprint
+import os
 import json 
 
 '''
@@ -11,12 +11,54 @@ Data parsed using methods in the data_collection.py file.
 Sources given in comments above chord_map and scale_map.
 '''
 
-names_to_spellings = {}
-generic_shapes = {}
-with open('./names_spellings2.json', 'r', encoding='utf-8') as file:
-    names_to_spellings = json.load(file)
-with open('./generic_shapes3.json', 'r', encoding='utf-8') as file:
-    generic_shapes = json.load(file)
+# names_to_spellings and generic_shapes are loaded from these files on first access (see 
+# __getattr__), relative to this file rather than the working directory.
+data_dir = os.path.dirname(os.path.abspath(__file__))
+data_files = {
+    'names_to_spellings': 'names_spellings2.json',
+    'generic_shapes': 'generic_shapes3.json'
+}
+
+# Optional cache of the parsed data files, pickled here and keyed by a hash of the source 
+# file. Enable with MUSIC_DATA_CACHE=1.
+cache_dir = os.path.join(data_dir, '.cache')
+use_cache = os.environ.get('MUSIC_DATA_CACHE', '0') == '1'
+
+def load_data_file(file_name):
+    """
+    Loads a json data file from data_dir, using the pickle cache when it matches the file.
+    """
+    with open(os.path.join(data_dir, file_name), 'rb') as file:
+        raw = file.read()
+    if not use_cache:
+        return json.loads(raw.decode('utf-8'))
+
+    import pickle, hashlib # only needed with the cache on
+    digest = hashlib.sha1(raw).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir, f"{file_name}.{digest}.pickle")
+    try:
+        with open(cache_path, 'rb') as file:
+            return pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass # no cache for this version of the file yet
+
+    data = json.loads(raw.decode('utf-8'))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path + '.tmp', 'wb') as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_path + '.tmp', cache_path)
+    except OSError:
+        pass # read-only checkout, just parse the json next time
+    return data
+
+def __getattr__(name):
+    # lazy module attributes for the json data, loaded once then stored as normal globals
+    if name in data_files:
+        value = load_data_file(data_files[name])
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 tones_to_integer = {
     '1': 0, 'b2': 1, '2': 2, '#2': 3, 'x2': 4, 'b3': 3, '3': 4, 'x3': 5, '4': 5, '#4': 6, 'x4': 7,
@@ -45,22 +87,63 @@ note_values = (
     ("G#", "Ab", "F###", "Bbbb")  # G#/Ab
 )
 
+# Every spelling in note_values -> its index (A = 0). "Ebb" and "Abb" appear in two rows; 
+# the later row is the right pitch (D and G), so later rows win.
+note_to_integer = {note: i for i, row in enumerate(note_values) for note in row if note is not None}
+
 import re
+import functools
+from collections import namedtuple
 
-@staticmethod
-def get_note_from_chord(name):
-    # This regular expression matches note names
-    note_pattern = r'[A-G](##?|bb?)?'
+# One pass over a chord symbol: text before the root (usually empty), the root note, the 
+# quality suffix and an optional slash bass note, ie "Bbm7/F" -> ('', 'Bb', 'm7', 'F')
+chord_pattern = re.compile(r'(?P<prefix>.*?)(?P<root>[A-G](?:##?|bb?)?)(?P<quality>.*?)(?:/(?P<bass>[A-G](?:##?|bb?)?))?', re.S)
 
-    # Search for the first note in the name string
-    match = re.search(note_pattern, name)
+class ParsedChord(namedtuple('ParsedChord', ['root', 'quality', 'bass', 'prefix'])):
+    """
+    Immutable parse of a chord symbol, as returned by parse_chord.
 
-    if match:
-        # If a note was found, return it
-        return match.group()
-    else:
-        # If no note was found, raise an error
-        return None    
+    Attributes:
+        root (str): The root note, ie 'Bb'.
+        quality (str): Everything after the root except the bass note, ie 'm7'.
+        bass (str): The slash bass note or None.
+        prefix (str): Any text before the root.
+    """
+    __slots__ = ()
+
+    @property
+    def generic_name(self):
+        # chord name without the root, with the bass note as an interval (Dm/C -> m/b7)
+        if self.bass is None:
+            return self.quality
+        return self.quality + '/' + integer_to_tones[note_distance(self.root, self.bass)]
+
+    def transpose(self, steps):
+        if not steps:
+            return self
+        return self._replace(root=transpose_note(self.root, steps), 
+                             bass=transpose_note(self.bass, steps) if self.bass else None)
+
+    def __str__(self):
+        return self.prefix + self.root + self.quality + ('/' + self.bass if self.bass else '')
+
+@functools.lru_cache(maxsize=4096)
+def parse_chord(name):
+    """
+    Parses a chord symbol into a ParsedChord, or None if it contains no note. Cached, so 
+    each distinct symbol is only parsed once.
+    """
+    if name is None:
+        return None
+    match = chord_pattern.fullmatch(name)
+    if match is None:
+        return None
+    return ParsedChord(match['root'], match['quality'], match['bass'], match['prefix'])
+
+@staticmethod
+def get_note_from_chord(name):
+    parsed = parse_chord(name)
+    return parsed.root if parsed else None
 
 @staticmethod
 def transpose_note(note, steps):
@@ -68,11 +151,8 @@ def transpose_note(note, steps):
         return note
     steps = int(steps)
     # Find the index of the note
-    for i, values in enumerate(note_values):
-        if note in values:
-            note_index = i
-            break
-    else:
+    note_index = note_to_integer.get(note)
+    if note_index is None:
         raise ValueError(f"Note {note} not found")
 
     # Add the transposition value, wrapping around the length of the tuple if necessary
@@ -81,33 +161,54 @@ def transpose_note(note, steps):
     # Return the transposed note
     return note_values[transposed_index][0]  # We return the first spelling of the note
 
-import re
 @staticmethod
 def transpose_chord(chord, steps):
     if steps == 0:
         return chord
-    # This regular expression matches note names in the chord
-    note_pattern = r'[A-G](##?|bb?)?'
-
-    # This function is used to transpose each note
-    def transpose_match(match):
-        note = match.group(0)
-        return transpose_note(note, steps)
-
-    # Use the re.sub function to replace each note in the chord with its transposition
-    transposed_chord = re.sub(note_pattern, transpose_match, chord)
+    parsed = parse_chord(chord)
+    if parsed is None:
+        return chord
+    return str(parsed.transpose(steps))
 
-    return transposed_chord
+def transpose_chart(chords, steps):
+    """
+    Transposes a list of chord symbols by steps, keeping order and duplicates. Each 
+    distinct symbol is parsed and transposed once.
+    """
+    if not steps:
+        return list(chords)
+    transposed = {}
+    for chord in dict.fromkeys(chords):
+        parsed = parse_chord(chord)
+        transposed[chord] = str(parsed.transpose(steps)) if parsed else chord
+    return [transposed[chord] for chord in chords]
+
+def transpose_chart_all(chords):
+    """
+    Returns all 12 transpositions of a list of chord symbols in one pass: 
+    result[steps] == transpose_chart(chords, steps).
+    """
+    transposed = {}
+    for chord in dict.fromkeys(chords):
+        parsed = parse_chord(chord)
+        if parsed is None:
+            transposed[chord] = [chord] * 12
+            continue
+        root = note_to_integer[parsed.root]
+        bass = note_to_integer[parsed.bass] if parsed.bass else None
+        row = [chord]
+        for steps in range(1, 12):
+            new_bass = '/' + note_values[(bass + steps) % 12][0] if bass is not None else ''
+            row.append(parsed.prefix + note_values[(root + steps) % 12][0] + parsed.quality + new_bass)
+        transposed[chord] = row
+    return [[transposed[chord][steps] for chord in chords] for steps in range(12)]
 
 @staticmethod
 # Function to calculate the distance between two notes
 def note_distance(note1, note2): 
     # Find the index of each note
-    for i, values in enumerate(note_values):
-        if note1 in values:
-            note1_index = i
-        if note2 in values:
-            note2_index = i
+    note1_index = note_to_integer[note1]
+    note2_index = note_to_integer[note2]
 
     # Calculate the distance between the notes
     distance = note2_index - note1_index
@@ -117,23 +218,13 @@ def note_distance(note1, note2):
 
 @staticmethod 
 def get_generic_chord_name(chord_name): 
-    root_note = get_note_from_chord(chord_name)
-    if root_note is None:  
-        return None
-    second_note = get_note_from_chord(chord_name.replace(root_note, '')) if len(chord_name) > 1 else None
-    if second_note:
-        interval = note_distance(root_note, second_note)
-        second_tone = integer_to_tones[interval]
-    
-    new_name = chord_name.replace(root_note, '')
-    if(second_note):
-        new_name = new_name.replace(second_note, second_tone)
-
-    return new_name
+    parsed = parse_chord(chord_name)
+    return parsed.generic_name if parsed else None
         
 @staticmethod
 def reduced_coords(coords): 
-    reduced_coords = coords
+    # a reduced copy, coords itself is left alone
+    reduced_coords = list(coords)
     min_fret = min([c for c in coords[1:] if c != 0 ]) - 1
     for i in range(1, len(coords)):
         if coords[i] != 0:
@@ -159,6 +250,39 @@ def reduced_coords(coords):
 
 # pprint.pprint(used_coords)
 
+# Spellings as 12-bit pitch-class masks: bit n is set when the spelling contains n 
+# (0 = root). Equality, subset/superset checks and transposition are single int operations.
+all_tones_mask = 0xFFF
+
+def spelling_to_mask(spelling): 
+    """
+    Converts an integer spelling (set, tuple, list or space separated string) to a bitmask.
+    """
+    if isinstance(spelling, str):
+        spelling = spelling.split()
+    mask = 0
+    for tone in spelling: 
+        mask |= 1 << (int(tone) % 12)
+    return mask
+
+def mask_to_spelling(mask): 
+    """
+    Converts a bitmask back to a sorted integer spelling tuple.
+    """
+    return tuple(tone for tone in range(12) if mask >> tone & 1)
+
+def transpose_mask(mask, steps): 
+    # rotate the 12 bits up by steps semitones
+    steps %= 12
+    return ((mask << steps) | (mask >> (12 - steps))) & all_tones_mask
+
+def mask_contains(mask, other): 
+    # True if every pitch class in other is also in mask
+    return mask & other == other
+
+def mask_size(mask): 
+    return bin(mask).count('1')
+
 @staticmethod
 def convert_spelling(spelling, conversion_type):
     """
@@ -176,10 +300,11 @@ def convert_spelling(spelling, conversion_type):
     elif conversion_type == 1 and type(spelling) != set:
         spelling = set(spelling)  # Convert to set
 
-    # Check if spelling is a chord name in chord_map
-    for chord_name, spellings in chord_map.items():
-        if spellings[conversion_type] == spelling:
-            return spellings[conversion_type - 1]  # Return other spelling type
+    # Check if spelling belongs to a chord in chord_map
+    if conversion_type == 0 and spelling in chord_map_by_standard: 
+        return chord_map_by_standard[spelling][1]
+    if conversion_type == 1 and spelling_to_mask(spelling) in chord_map_by_mask: 
+        return chord_map_by_mask[spelling_to_mask(spelling)][0]  # Return standard spelling
 
     # If mapping not found, convert manually (only using flats)
 
@@ -312,6 +437,8 @@ chord_map = {
 
 
 chord_map_invert = {v[1]: (k, v[0]) for k, v in chord_map.items()}
+chord_map_by_standard = {v[0]: v for v in chord_map.values()}
+chord_map_by_mask = {spelling_to_mask(v[1]): v for v in chord_map.values()}
 
 #Dictionary of scale names and their spellings in integer notation. 
 #Source: https://www.daqarta.com/dw_ss0a.htm
@@ -841,6 +968,7 @@ scale_map = {'Aeolian': (0, 2, 3, 5, 7, 8, 10),
  'Whole-Tone Tetramirror': (0, 2, 4, 6)}
 
 scale_map_invert = {v: k for k, v in scale_map.items()}
+scale_map_by_mask = {spelling_to_mask(v): k for k, v in scale_map.items()}
 
 # pprint.pprint(chord_map_invert)
 # print()
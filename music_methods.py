@@ -1,32 +1,45 @@
+import bisect
+import functools
 import itertools
-import pprint
+import collections
 import music_data as md 
 import music_objects as mo
 import json
 
-@staticmethod
+# chord name or alias -> spelling, built once from md.names_to_spellings. The first entry
+# listing a name wins, same as the old linear scan.
+chord_name_index = None
+longest_chord_name = 0
+
+def build_chord_name_index(): 
+    global chord_name_index, longest_chord_name
+    index = {}
+    for entry in md.names_to_spellings['chords']: 
+        for name in entry['names']: 
+            index.setdefault(name, entry['spelling'])
+    longest_chord_name = max((len(name) for name in index), default=0)
+    chord_name_index = index
+    find_spelling_from_name.cache_clear()
+    return chord_name_index
+
+@functools.lru_cache(maxsize=1024)
 def find_spelling_from_name(chord_name): 
     if chord_name is None: 
         return None
-    spelling = None
-    for entry in md.names_to_spellings['chords']: 
-        if chord_name in entry['names']: 
-            spelling = entry['spelling']
-            break
+    if chord_name_index is None: 
+        build_chord_name_index()
+    spelling = chord_name_index.get(chord_name)
+    if spelling is not None or len(chord_name) <= 2: 
+        return spelling
 
-    # try removing 1, then 2 chars from name (ie A7b9#5 -> A7b9 or Cmaj7 -> Cmaj) if no spelling found
-    if spelling is None and len(chord_name) > 2: 
-        tone = None
-        for i in range(1,3): 
-            
-            new_spelling = find_spelling_from_name(chord_name[:-i])
-            if new_spelling is not None: 
-                return new_spelling
-            
-            #spelling = short_spelling + [md.tones_to_integer[tones[i]]]        
-                
+    # fall back to the longest known prefix (ie A7b9#5 -> A7b9 or Cmaj7 -> Cmaj). Prefixes 
+    # longer than any known name can't match, so at most longest_chord_name lookups.
+    for end in range(min(len(chord_name) - 1, longest_chord_name), 0, -1): 
+        spelling = chord_name_index.get(chord_name[:end])
+        if spelling is not None: 
+            return spelling
     
-    return spelling
+    return None
 
 # @staticmethod
 # # return 7-digit list of coordinates for a chord spelling
@@ -39,44 +52,225 @@ def find_spelling_from_name(chord_name):
 #     return None
 import random
 
+# spelling mask -> generic shape coords with that spelling, the same coords reduced and 
+# deduplicated for options = 1, and the distinct shared mo.ShapeTemplates of those coords. 
+# Built once on first use instead of on every lookup.
+shape_index = None
+reduced_shape_index = None
+template_index = None
+
+def build_shape_index(): 
+    global shape_index, reduced_shape_index, template_index
+    shape_index = {}
+    reduced_shape_index = {}
+    template_index = {}
+    for entry in md.generic_shapes['shapes']:
+        template = mo.ShapeTemplate.from_coords(entry['coords'])
+        if template is None or not template.mask: 
+            continue
+        key = template.mask
+        shape_index.setdefault(key, []).append(list(entry['coords']))
+        template_index.setdefault(key, {})[template] = None
+
+    for key, coords in shape_index.items(): 
+        reduced = dict.fromkeys(tuple(md.reduced_coords(row)) for row in coords)
+        reduced_shape_index[key] = [list(row) for row in reduced]
+        template_index[key] = list(template_index[key])
+    return shape_index
+
 @staticmethod
 def find_coords_from_spelling(spelling, options = 0): 
     if spelling is None: 
         return None
-    shapes = md.generic_shapes['shapes']
+    if shape_index is None: 
+        build_shape_index()
+    key = md.spelling_to_mask(spelling)
     
     if options == 1: 
-        coords = [] 
-        for entry in shapes:
-            shape = mo.ChordShape(entry['coords']) 
-            if shape.spelling == set(spelling):  
-                coords.append(entry['coords'])
-        
-        if len(coords) > 1:
-            coords = [list(item) for item in set(tuple(md.reduced_coords(row)) for row in coords)]
-            return coords
-    else:
-        random.shuffle(shapes)
-        for entry in shapes:
-            shape = mo.ChordShape(entry['coords']) 
-            if shape.spelling == set(spelling): 
-                return entry['coords']
-    return None
+        coords = reduced_shape_index.get(key)
+        return [list(row) for row in coords] if coords else None
+    
+    coords = shape_index.get(key)
+    return list(random.choice(coords)) if coords else None
+
+# (spelling mask, root note, tuning base notes) -> (min frets, max frets, shapes): every generic 
+# shape with that spelling moved to the root, at each octave that fits on the neck, sorted by 
+# (min_fret, max_fret). The generic shapes are in standard tuning, so spellings with no generic 
+# shape and every other tuning get enumerate_voicings instead. Holds standard tuning and the 
+# other presets in mo.tunings, a fixed set, so it never needs evicting.
+# Shapes are stored as mo.CompactChordShape, diagrams are only built when rendered.
+voicing_index = {}
+neck_frets = 24
+
+# the same for custom tunings (notes from a query string), one dict per tuning for the 
+# max_custom_tunings most recently used: tuning base notes -> {key: voicings}
+custom_voicing_indexes = collections.OrderedDict()
+max_custom_tunings = 8
+
+def tuning_voicing_index(base_notes): 
+    # where a tuning's voicings are kept, see voicing_index and custom_voicing_indexes
+    if base_notes in mo.tunings_by_notes: 
+        return voicing_index
+    index = custom_voicing_indexes.pop(base_notes, None)
+    if index is None: 
+        index = {}
+    custom_voicing_indexes[base_notes] = index
+    while len(custom_voicing_indexes) > max_custom_tunings: 
+        custom_voicing_indexes.popitem(last=False)
+    return index
+
+def find_voicings(spelling, note, tuning = None): 
+    """
+    Returns the ranked voicings for a spelling on a root note (str or int) as 
+    (min_frets, max_frets, shapes), three lists in the same order.
+    """
+    if isinstance(note, str): 
+        note = md.note_to_integer.get(note)
+    if spelling is None or note is None: 
+        return [], [], []
+    tuning = mo.get_tuning(tuning)
+    key = (md.spelling_to_mask(spelling), note, tuning.base_notes)
+    index = tuning_voicing_index(tuning.base_notes)
+    if key in index: 
+        return index[key]
+    if shape_index is None: 
+        build_shape_index()
+    if key[0] not in shape_index or tuning.base_notes != mo.standard_tuning.base_notes: 
+        # no collected shape for this spelling or tuning, generate voicings instead. Root 
+        # position only on guitars, ukulele and mandolin chords rarely start on the root.
+        index[key] = enumerate_voicings(spelling, note, max_fret=neck_frets, 
+                                        root_position=tuning.strings >= 6, tuning=tuning)
+        return index[key]
+
+    # every placement of each shared template on the root that fits on the neck
+    shapes = {}
+    for template in template_index[key[0]]: 
+        for fret in range(template.root_fret(note), neck_frets + 2, 12): 
+            if template.fits(fret, neck_frets): 
+                shape = template.place(fret)
+                shapes.setdefault(shape.coords, shape)
+
+    ranked = sorted(shapes.values(), key=lambda s: (s.diagram.min_fret, s.diagram.max_fret, s.coords))
+    voicing_index[key] = ([s.diagram.min_fret for s in ranked], [s.diagram.max_fret for s in ranked], ranked)
+    return voicing_index[key]
+
+def find_voicings_in_range(spelling, note, fret_range = None, tuning = None): 
+    """
+    Yields the ranked voicings whose diagram lies within fret_range ([low, high]). Bisects 
+    to the first voicing starting at low, so at most one pass over the candidates.
+    """
+    min_frets, max_frets, shapes = find_voicings(spelling, note, tuning)
+    low, high = fret_range if fret_range else (-1, 1000)
+    for i in range(bisect.bisect_left(min_frets, low), len(shapes)): 
+        if min_frets[i] > high: 
+            break
+        if max_frets[i] <= high: 
+            yield shapes[i]
+
+def find_voicing_in_range(spelling, note, fret_range = None, tuning = None): 
+    # best ranked voicing in range, or None if there is no voicing in range
+    return next(find_voicings_in_range(spelling, note, fret_range, tuning), None)
+
+def enumerate_voicings(spelling, note, max_span = 3, max_fret = 12, min_strings = 4, root_position = True, tuning = None): 
+    """
+    Generates every playable voicing of a spelling on a root note (str or int) in a tuning 
+    (standard by default), ranked like find_voicings. Muted strings are only allowed 
+    below and above the played strings, every tone of the spelling must sound and at most 
+    4 fingers are used (a barre on the lowest fret counts as one). Voicings must play the 
+    root somewhere, so spellings without 0 have none.
+
+    Parameters:
+        spelling (list of int): The chord spelling.
+        note (str or int): The root note.
+        max_span (int): Most frets between the lowest and highest fretted note.
+        max_fret (int): Highest fret used.
+        min_strings (int): Fewest played strings (never more than the 6 strings).
+        root_position (bool): Whether the lowest played string must be the root.
+        tuning (Tuning or str): The tuning, see mo.get_tuning.
+
+    Returns:
+        tuple: (min_frets, max_frets, shapes), three lists in the same order, shapes are 
+        mo.CompactChordShape.
+    """
+    if isinstance(note, str): 
+        note = md.note_to_integer.get(note)
+    if spelling is None or note is None: 
+        return [], [], []
+    tuning = mo.get_tuning(tuning)
+    return search_voicings(md.spelling_to_mask(spelling), note % 12, max_span, max_fret, 
+                           min(min_strings, tuning.strings), root_position, tuning.base_notes)
+
+@functools.lru_cache(maxsize=1024)
+def search_voicings(mask, note, max_span, max_fret, min_strings, root_position, base_notes = mo.standard_tuning.base_notes): 
+    # depth first over the strings from low to high, pruning any partial voicing that 
+    # can't become playable. Keyed on the tuning's base notes, not its name.
+    tuning = mo.tuning_for_notes(base_notes)
+    tones = md.transpose_mask(mask, note)
+    strings = len(base_notes)
+    # frets on each string that play a chord tone
+    options = [[fret for fret in range(max_fret + 1) if tones >> ((base_note + fret) % 12) & 1] 
+               for base_note in base_notes]
+    found = []
+    frets = [None] * strings
+
+    def search(string, heard, low, high, played): 
+        missing = md.mask_size(tones & ~heard)
+        if string == strings or (played and frets[string - 1] is None): 
+            # every string is placed, or the voicing ended with a muted string
+            if not missing and played >= min_strings: 
+                found.append(frets[:string] + [None] * (strings - string))
+            return
+        # not enough strings left for the missing tones or the string count
+        if strings - string < max(missing, min_strings - played): 
+            return
+        # mute this string: before the first played string, or to end the voicing
+        frets[string] = None
+        search(string + 1, heard, low, high, played)
+        for fret in options[string]: 
+            pitch = (base_notes[string] + fret) % 12
+            if not played and root_position and pitch != note: 
+                continue
+            new_low, new_high = (min(low, fret), max(high, fret)) if fret else (low, high)
+            if new_high - new_low > max_span: 
+                continue
+            frets[string] = fret
+            search(string + 1, heard | 1 << pitch, new_low, new_high, played + 1)
+        frets[string] = None
+
+    search(0, 0, 1000, -1, 0)
+
+    shapes = []
+    for row in found: 
+        fretted = [fret for fret in row if fret]
+        # one finger for the lowest fret (a barre if needed), one for each other fretted note
+        if fretted and 1 + sum(fret != min(fretted) for fret in fretted) > 4: 
+            continue
+        coords = tuple(fret + 1 if fret is not None else 0 for fret in row)
+        root = next((i + 1 for i, fret in enumerate(row) if fret is not None and (base_notes[i] + fret) % 12 == note), None)
+        if root is None: 
+            # rootless (spelling without tone 0), nothing to measure the shape from
+            continue
+        shapes.append(mo.CompactChordShape(root, coords, tuning))
+
+    ranked = sorted(shapes, key=lambda s: (s.diagram.min_fret, s.diagram.max_fret, s.coords))
+    return ([s.diagram.min_fret for s in ranked], [s.diagram.max_fret for s in ranked], ranked)
+
+def find_spelling_from_chord(chord): 
+    # chord is a symbol like "Dm7/C" or an already parsed md.ParsedChord
+    parsed = md.parse_chord(chord) if isinstance(chord, str) else chord
+    if parsed is None: 
+        return None
+    return find_spelling_from_name(parsed.generic_name)
 
 def chord_to_tones(chord_name): 
-    note = md.get_note_from_chord(chord_name)
-    generic_name = md.get_generic_chord_name(chord_name)
-    spelling = find_spelling_from_name(generic_name)
+    parsed = md.parse_chord(chord_name)
+    spelling = find_spelling_from_chord(parsed)
 
     if spelling is None: 
         return None
     
-    note_val = None
     # find note value for root note
-    for i, notes in enumerate(md.note_values): 
-        if note in notes: 
-            note_val = i
-
+    note_val = md.note_to_integer.get(parsed.root)
     if note_val is None:
         return None
 
@@ -104,50 +298,146 @@ def chord_to_notes(chord_name):
         return None
     return tones_to_notes(note, int_notes)
 
+# absolute pitch-class mask (A = 0) -> [(scale name, key), ...] for every scale in scale_map 
+# in all 12 keys. Modes of one scale share a mask (C Ionian, D Dorian, A Aeolian...).
+scale_key_index = None
+
+def build_scale_key_index(): 
+    global scale_key_index
+    index = {}
+    for name, spelling in md.scale_map.items(): 
+        mask = md.spelling_to_mask(spelling)
+        for key in range(12): 
+            index.setdefault(md.transpose_mask(mask, key), []).append((name, key))
+    scale_key_index = index
+    scales_containing_mask.cache_clear()
+    return scale_key_index
+
+@functools.lru_cache(maxsize=4096)
+def scales_containing_mask(mask): 
+    """
+    All (extra notes, scale name, key) whose notes contain every pitch class in mask, fewest 
+    extra notes first. Results are cached per mask, so repeat queries are one lookup.
+    """
+    if scale_key_index is None: 
+        build_scale_key_index()
+    missing = md.all_tones_mask & ~mask
+    if md.mask_size(missing) <= 7: 
+        # few notes left to add: look up each superset of mask directly
+        supersets = []
+        extra = missing
+        while True: 
+            if mask | extra in scale_key_index: 
+                supersets.append(mask | extra)
+            if extra == 0: 
+                break
+            extra = (extra - 1) & missing
+    else: 
+        supersets = [other for other in scale_key_index if other & mask == mask]
+    size = md.mask_size(mask)
+    return tuple(sorted((md.mask_size(other) - size, name, key) 
+                        for other in supersets for name, key in scale_key_index[other]))
+
+def notes_to_mask(notes): 
+    # note names ("C", "Eb") or pitch classes (A = 0) -> absolute pitch-class mask
+    mask = 0
+    for note in notes: 
+        tone = md.note_to_integer.get(note) if isinstance(note, str) else note
+        if tone is None: 
+            raise ValueError(f"Note {note} not found")
+        mask |= 1 << (tone % 12)
+    return mask
+
+def find_scales_containing(notes, limit = None): 
+    """
+    Finds every scale, in every key, that contains the given notes.
+
+    Parameters:
+        notes (list or int): Note names, pitch classes (A = 0) or an absolute pitch-class mask.
+        limit (int): Maximum number of results, all by default.
+
+    Returns:
+        list of dict: scale, key, tonic (pitch class) and extra (notes the scale adds), 
+        ranked by fewest extra notes.
+    """
+    mask = notes if isinstance(notes, int) else notes_to_mask(notes)
+    matches = scales_containing_mask(mask & md.all_tones_mask)
+    if limit is not None: 
+        matches = matches[:limit]
+    return [{'scale': name, 'key': md.note_values[key][0], 'tonic': key, 'extra': extra} 
+            for extra, name, key in matches]
+
+def find_scales_for_chord(chord_name, limit = None): 
+    # scales containing every note of a chord symbol, or None if the chord is unknown
+    tones = chord_to_tones(chord_name)
+    if tones is None: 
+        return None
+    return find_scales_containing(tones, limit)
+
+def name_voicing(coords, note = None, tuning = None): 
+    """
+    Names the chord played by a shape.
+
+    Parameters:
+        coords (list of int): [root string, fret 1, ..., fret 6] or just the frets (one per 
+            string of the tuning), in the ChordShape format (0 = muted, 1 = open). A root string of 0 picks the lowest 
+            played string.
+        note (str): Optional root note, used like ChordShape's note to move the shape.
+        tuning (Tuning or str): The tuning, standard by default.
+
+    Returns:
+        dict: the root string's note, best name, every (root, name) reading of the notes, 
+        aliases, scale and the processed coords, or None if the root string is not played.
+    """
+    tuning = mo.get_tuning(tuning)
+    coords = list(coords)
+    if len(coords) == tuning.strings: 
+        coords = [0] + coords
+    if not any(coords[1:]): 
+        return None
+    shape = mo.CompactChordShape.from_coords(coords, note, tuning)
+    if not shape.root or not shape.coords[shape.root - 1]: 
+        return None
+    bass = shape.notes[shape.root - 1]
+    entry = mo.name_mask(shape.mask)
+    return {'note': md.note_values[bass][0], 
+            'name': entry.name, 
+            'readings': [{'root': md.note_values[(bass + root) % 12][0], 'name': name} for root, name in entry.roots], 
+            'aliases': list(entry.aliases), 
+            'scale': entry.scale, 
+            'coords': [shape.root] + list(shape.coords)}
+
 @staticmethod
-def display_chord(chord_name, transpose = 0, options = 0, fret_range = None, iter = 0): 
-    if iter > 15: 
-        print("No chord found for", chord_name)
-        return 0
-    
+def display_chord(chord_name, transpose = 0, options = 0, fret_range = None, tuning = None): 
     if fret_range is None or not isinstance(fret_range, list) or len(fret_range) != 2:
         fret_range = [-1, 1000]
 
     chord_name = md.transpose_chord(chord_name, transpose)
-    note = md.get_note_from_chord(chord_name)
-    generic_name = md.get_generic_chord_name(chord_name)
+    parsed = md.parse_chord(chord_name)
+    if parsed is None: 
+        print("No chord found for", chord_name)
+        return 0
+    note = parsed.root
+    generic_name = parsed.generic_name
     spelling = find_spelling_from_name(generic_name)
-    coords = find_coords_from_spelling(spelling, options)
     
-    if coords is None: 
+    if not find_voicings(spelling, note, tuning)[2]: 
         print("No chord found for", generic_name)
         return 0
-    
 
-    if coords and isinstance(coords[0], list):
-        used_coords = []
-        for row in coords:
-            if md.reduced_coords(row) in used_coords: 
-                continue
-            used_coords.append(md.reduced_coords(row))
-
-            shape_obj = mo.ChordShape(row, note) 
-            if shape_obj.diagram.min_fret >= fret_range[0] and shape_obj.diagram.max_fret <= fret_range[1]:
-                print(shape_obj)
-                shape_obj.print_diagram(2)
+    if options == 1:
+        for shape_obj in find_voicings_in_range(spelling, note, fret_range, tuning):
+            print(shape_obj)
+            shape_obj.print_diagram(2)
         return 0
     
-    else:
-        shape_obj = mo.ChordShape(coords, note) 
-        if shape_obj.diagram.min_fret >= fret_range[0] and shape_obj.diagram.max_fret <= fret_range[1]:
-            print(shape_obj)
-            shape_obj.print_diagram()
-            return 0 
-        else: 
-            if isinstance(fret_range, list):
-                fret_range = "-".join(map(str, fret_range))
-            display_chord(chord_name, options, fret_range, iter= iter + 1)
-            return 0 
+    shape_obj = find_voicing_in_range(spelling, note, fret_range, tuning)
+    if shape_obj is None: 
+        print("No voicing in range for", chord_name)
+        return 0
+    print(shape_obj)
+    shape_obj.print_diagram()
+    return 0 
 
 @staticmethod
 def display_chord_loop(): 
@@ -188,42 +478,195 @@ def display_chord_loop():
         print("Chord:", chord_name, "Transpose:", transpose, "Options:", options, "Fret Range:", fret_range)
         display_chord(chord_name, transpose, options, fret_range)
 
-def get_chord_diagrams(chords, fret_range): 
+def diagram_rows(diagram_obj): 
+    # text rows of a chord diagram (mo.Diagram or mo.CompactDiagram) as shown on the song page
+    return diagram_obj.rows()
+
+# precomputed voicing_table.VoicingTable, see load_voicing_table
+voicing_table = None
+
+def load_voicing_table(path = None): 
+    """
+    Memory-maps the precomputed voicing table (building it if needed) so get_chord_diagrams 
+    reads diagrams from it instead of building ChordShapes. If the table can't be built (a 
+    read-only checkout), voicing_table stays None and find_voicings is used instead.
+    """
+    global voicing_table
+    import voicing_table as vt
+    try:
+        voicing_table = vt.load_table(path or vt.default_path)
+    except OSError as e:
+        print(f"voicing table unavailable, using find_voicings: {e}")
+        voicing_table = None
+    return voicing_table
+
+def voicing_distance(coords1, coords2): 
+    # how far the fingers move between two voicings: the fret change on each string played 
+    # in both, and 1 for each string that starts or stops sounding
+    distance = 0
+    for fret1, fret2 in zip(coords1, coords2): 
+        if fret1 and fret2: 
+            distance += abs(fret1 - fret2)
+        elif fret1 or fret2: 
+            distance += 1
+    return distance
+
+def choose_voicings(candidates, distance = voicing_distance): 
+    """
+    Picks one voicing per chord so the total movement through the progression is smallest, 
+    by dynamic programming over the candidates (Viterbi): O(chords x candidates^2) distance 
+    calls instead of trying every combination. Ties go to the better ranked voicings.
+
+    Parameters:
+        candidates (list of list): Candidate coords (6 frets) for each chord, best ranked 
+            first. Chords with no candidates are skipped over.
+        distance (function): Cost of moving between two voicings.
+
+    Returns:
+        list of int: Index of the chosen candidate for each chord, None where there were none.
+    """
+    steps = [i for i, options in enumerate(candidates) if options]
+    choices = [None] * len(candidates)
+    if not steps: 
+        return choices
+
+    # costs[j] = movement * rank_weight + rank sum of the best path ending on candidate j, 
+    # so movement always wins and the rank sum only breaks ties
+    rank_weight = sum(map(len, candidates)) ** 2 + 1
+    costs = list(range(len(candidates[steps[0]])))
+    back = []
+    for prev, step in zip(steps, steps[1:]): 
+        new_costs, pointers = [], []
+        previous = list(zip(costs, candidates[prev]))
+        for j, coords in enumerate(candidates[step]): 
+            moves = [cost + distance(prev_coords, coords) * rank_weight for cost, prev_coords in previous]
+            best_k = min(range(len(moves)), key=moves.__getitem__)
+            new_costs.append(moves[best_k] + j)
+            pointers.append(best_k)
+        costs = new_costs
+        back.append(pointers)
+
+    # walk back from the cheapest end
+    j = min(range(len(costs)), key=costs.__getitem__)
+    choices[steps[-1]] = j
+    for step, pointers in zip(reversed(steps[:-1]), reversed(back)): 
+        j = pointers[j]
+        choices[step] = j
+    return choices
+
+def voicing_difficulty(coords): 
+    """
+    Playability score of a voicing's 6 coords, lower is easier: the fret span of the fretted 
+    notes, 2 for a barre (more than 4 fretted notes, or 4 with 2 sharing the lowest fret), 
+    a quarter per fret up the neck, less half a point per open string.
+    """
+    fretted = [coord - 1 for coord in coords if coord > 1]
+    open_strings = sum(coord == 1 for coord in coords)
+    if not fretted: 
+        return -0.5 * open_strings
+    low = min(fretted)
+    barre = len(fretted) > 4 or (len(fretted) == 4 and fretted.count(low) > 1)
+    return max(fretted) - low + 2 * barre + 0.25 * low - 0.5 * open_strings
+
+@functools.lru_cache(maxsize=4096)
+def easiest_voicing(mask, root, fret_range = (0, 5)): 
+    # (difficulty, coords) of the easiest voicing of a spelling mask on a root in fret_range, 
+    # or None. Reads the voicing table when it is loaded.
+    if voicing_table is not None and voicing_table.count(mask, root): 
+        coords = (tuple(voicing_table.get_coords(i)[1:]) for i in voicing_table.find_all_in_range(mask, root, fret_range))
+    else: 
+        coords = (shape.coords for shape in find_voicings_in_range(md.mask_to_spelling(mask), root, fret_range))
+    return min(((voicing_difficulty(row), row) for row in coords), default=None)
+
+def find_capo_positions(chords, fret_range = (0, 5), missing_penalty = 10): 
+    """
+    Ranks all 12 capo positions for a chord list by how easy the chord shapes are to play.
+
+    With the capo on fret n each chord is played with the shape of the chord n semitones 
+    lower, so the song sounds in the same key. Each distinct chord is scored by its easiest 
+    voicing in fret_range (see voicing_difficulty), chords with no voicing there cost 
+    missing_penalty.
+
+    Returns:
+        list of dict: capo, score, shapes (the chord names to play) and missing (chords with 
+        no voicing in range), easiest first.
+    """
+    chords = list(dict.fromkeys(chords))
+    fret_range = tuple(fret_range)
+    parsed = []
+    for chord in chords: 
+        chord_obj = md.parse_chord(chord)
+        spelling = find_spelling_from_chord(chord_obj)
+        if spelling is None: 
+            parsed.append(None)
+            continue
+        parsed.append((md.spelling_to_mask(spelling), md.note_to_integer[chord_obj.root]))
+
+    positions = []
+    for capo in range(12): 
+        score, missing = 0, []
+        for chord, key in zip(chords, parsed): 
+            easiest = easiest_voicing(key[0], (key[1] - capo) % 12, fret_range) if key else None
+            if easiest is None: 
+                score += missing_penalty
+                missing.append(chord)
+            else: 
+                score += easiest[0]
+        positions.append({'capo': capo, 'score': score, 'shapes': md.transpose_chart(chords, -capo), 'missing': missing})
+    return sorted(positions, key=lambda position: (position['score'], position['capo']))
+
+def get_chord_diagrams(chords, fret_range, voice_leading = False, max_candidates = 40, tuning = None): 
+    """
+    Diagram rows for each distinct chord, in order of first appearance. Each chord gets its 
+    best ranked voicing in fret_range, or with voice_leading the voicings that move the hand 
+    least from one chord to the next (out of the best max_candidates for each chord). The 
+    voicing table only holds standard tuning, other tunings use find_voicings.
+    """
+    tuning = mo.get_tuning(tuning)
+    table = voicing_table if tuning.base_notes == mo.standard_tuning.base_notes else None
     chord_diagrams = []
     chords = list(dict.fromkeys(chords))
     if fret_range and "-" in fret_range:
         fret_range = fret_range.split("-")
         fret_range = [int(fret_range[0]), int(fret_range[1])]
+    limit = max_candidates if voice_leading else 1
 
+    # per chord: (coords, voicing table index or shape) candidates, or an error message
+    candidates = []
     for chord in chords: 
-        chord_name = md.get_generic_chord_name(chord)
-        spelling = find_spelling_from_name(chord_name)
-        range_good = False
-
-        while not range_good:
-            coords = find_coords_from_spelling(spelling)
-            if coords is None: 
-                chord_diagrams.append([chord, "No chord found"])
-                range_good = False
-                break 
-
-            diagram_obj = mo.ChordShape(coords, chord).diagram
-            if diagram_obj.min_fret >= fret_range[0] and diagram_obj.max_fret <= fret_range[1]: 
-                range_good = True
-                break
-        if not range_good: #means no chord found
+        parsed = md.parse_chord(chord)
+        spelling = find_spelling_from_chord(parsed)
+        if spelling is None: 
+            candidates.append("No chord found")
             continue
 
-        diagram = diagram_obj.diagram
-        string_diagram = [chord]
-        for i in range(len(diagram) ):
-            row = diagram[i]
-            row_num = str(i + diagram_obj.min_fret - 1) if i + diagram_obj.min_fret - 1 in diagram_obj.fret_numbers else ""
-            string_diagram.append("  ".join(str(element).ljust(diagram_obj.max_width) for element in row) + " " + row_num)
+        mask, root = md.spelling_to_mask(spelling), md.note_to_integer[parsed.root]
+        if table is not None and table.count(mask, root): 
+            found = [(tuple(table.get_coords(i)[1:]), i) 
+                     for i in itertools.islice(table.find_all_in_range(mask, root, fret_range), limit)]
+        elif not find_voicings(spelling, parsed.root, tuning)[2]: 
+            candidates.append("No chord found")
+            continue
+        else: 
+            found = [(shape.coords, shape) 
+                     for shape in itertools.islice(find_voicings_in_range(spelling, parsed.root, fret_range, tuning), limit)]
+        candidates.append(found or "No voicing in range")
 
-        chord_diagrams.append(string_diagram)
+    options = [[coords for coords, _ in found] if isinstance(found, list) else [] for found in candidates]
+    choices = choose_voicings(options) if voice_leading else [0 if found else None for found in options]
+
+    for chord, found, choice in zip(chords, candidates, choices): 
+        if choice is None: 
+            chord_diagrams.append([chord, found])
+            continue
+        voicing = found[choice][1]
+        if isinstance(voicing, int): 
+            chord_diagrams.append([chord] + table.rows(voicing))
+        else: 
+            chord_diagrams.append([chord] + diagram_rows(voicing.diagram))
 
-    
     return chord_diagrams
 
-pprint.pprint(get_chord_diagrams(["Cm7b5", "F7b9"], "0-5"))
\ No newline at end of file
+if __name__ == "__main__":
+    import pprint
+    pprint.pprint(get_chord_diagrams(["Cm7b5", "F7b9"], "0-5"))
\ No newline at end of file
@@ -1,8 +1,9 @@
-import pprint
+import re
 import sys
 import random
+import functools
 import music_data
-from collections import deque
+from collections import deque, namedtuple
 import sqlite3
 
 """
@@ -17,6 +18,83 @@ Version: 1.2.1
 base_notes =  [7, 12, 17, 22, 26, 31] #Standard tuning EADGBE in integer notation (A = 0, G# = 11)
 
 
+class Tuning(namedtuple('Tuning', ['name', 'base_notes'])):
+    """
+    Open string notes of an instrument from the lowest string up, in the base_notes format 
+    (A = 0, only the pitch class matters). Any number of strings works, so the presets include 
+    other instruments. Shapes, scales and voicings take a Tuning, a preset name from tunings, 
+    or None for standard tuning.
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def from_notes(name, notes):
+        # "D A D G B E" or "DADGBE" -> (5, 12, 17, 22, 26, 31)
+        if isinstance(notes, str):
+            notes = re.findall(r'[A-G](?:##?|bb?)?|\S', notes.replace(",", " "))
+        # voicing search grows exponentially with the strings, and notes come from query strings
+        if not 0 < len(notes) <= max_strings:
+            raise ValueError(f"Tunings need 1 to {max_strings} strings, got {len(notes)}")
+        base = []
+        for note in notes:
+            value = music_data.note_to_integer.get(note)
+            if value is None:
+                raise ValueError(f"Note {note} not found")
+            while base and value <= base[-1]:
+                value += 12
+            base.append(value)
+        return Tuning(name, tuple(base))
+
+    @property
+    def strings(self):
+        return len(self.base_notes)
+
+max_strings = 8
+standard_tuning = Tuning('standard', tuple(base_notes))
+tunings = {tuning.name: tuning for tuning in (
+    standard_tuning,
+    Tuning('drop D', (5, 12, 17, 22, 26, 31)),
+    Tuning('DADGAD', (5, 12, 17, 22, 24, 29)),
+    Tuning('open G', (5, 10, 17, 22, 26, 29)),
+    Tuning('open D', (5, 12, 17, 21, 24, 29)),
+    Tuning('open E', (7, 14, 19, 23, 26, 31)),
+    Tuning('half-step down', (6, 11, 16, 21, 25, 30)),
+    Tuning('whole-step down', (5, 10, 15, 20, 24, 29)),
+    Tuning('drop C', (3, 10, 15, 20, 24, 29)),
+    # other instruments
+    Tuning('7-string', (2, 7, 12, 17, 22, 26, 31)),
+    Tuning('bass', (7, 12, 17, 22)),
+    Tuning('5-string bass', (2, 7, 12, 17, 22)),
+    Tuning('ukulele', (10, 15, 19, 24)),
+    Tuning('baritone ukulele', (5, 10, 14, 19)),
+    Tuning('mandolin', (10, 17, 24, 31)),
+)}
+# base notes -> preset, the first preset listed wins
+tunings_by_notes = {}
+for tuning in tunings.values():
+    tunings_by_notes.setdefault(tuning.base_notes, tuning)
+
+def tuning_for_notes(base_notes):
+    # the preset with these base notes or an unnamed custom tuning. Caches key on base notes 
+    # and build with this, so "DADGAD" and "D A D G A D" share their entries.
+    base_notes = tuple(base_notes)
+    return tunings_by_notes.get(base_notes) or Tuning('custom', base_notes)
+
+def get_tuning(tuning = None):
+    """
+    Returns a Tuning for a Tuning, a preset name, a string of notes ("DADGAD" or 
+    "D A D G A D") or None (standard).
+    """
+    if tuning is None:
+        return standard_tuning
+    if isinstance(tuning, Tuning):
+        return tuning
+    if tuning in tunings:
+        return tunings[tuning]
+    tuning = Tuning.from_notes(tuning, tuning)
+    return tunings_by_notes.get(tuning.base_notes, tuning)
+
+
 # Define the Chord class and a function to create instances for each chord from the file
 class Chord:
     """
@@ -26,6 +104,7 @@ class Chord:
         name (str): The name of the chord.
         standard_spelling (str): The standard notation of the chord.
         integer_spelling (set of int): The integer representation of the chord.
+        mask (int): 12-bit pitch-class mask of the integer spelling (bit n set for tone n).
     """
 
     def __init__(self, name = None, standard_spelling = None, integer_spelling = None):
@@ -60,6 +139,7 @@ class Chord:
         
         if not self.integer_spelling:
             raise ValueError("At least one of standard_spelling or integer_spelling must be provided")
+        self.mask = music_data.spelling_to_mask(self.integer_spelling)
         
         # print(music_data.chord_map_invert[])
         if not self.name and self.integer_spelling in music_data.chord_map_invert:
@@ -82,6 +162,17 @@ class Chord:
 
     def set_integer_spelling(self, integer_spelling):
         self.integer_spelling = integer_spelling
+        self.mask = music_data.spelling_to_mask(integer_spelling)
+
+    def get_mask(self):
+        return self.mask
+
+    @staticmethod
+    def from_mask(mask, name = None):
+        """
+        Creates a Chord from a 12-bit pitch-class mask.
+        """
+        return Chord(name, None, music_data.mask_to_spelling(mask))
 
     def __repr__(self):
         return f"Chord(name='{self.name}', standard_spelling='{self.standard_spelling}', integer_spelling='{self.integer_spelling}')"
@@ -108,26 +199,30 @@ class ChordShape(Chord):
 
     """
 
-    def __init__(self, coords, note = None):
+    def __init__(self, coords, note = None, tuning = None):
         """
         Initializes a ChordShape instance.
 
         Parameters:
             coords (list of int): Coordinates representing the chord shape on the fretboard.
+            note (str or int): Optional root note to move the shape to.
+            tuning (Tuning or str): The instrument tuning, standard by default.
         """
-        if coords == self.empty_chord or coords == self.empty_chord[1:]:
+        if isinstance(coords, list) and not any(coords):
             return
         
         self.is_valid = True
         self.fret = "O"
         self.r_fret = "0"
+        self.tuning = get_tuning(tuning)
 
-        coords = ChordShape.process_coords(coords, note)
+        coords = ChordShape.process_coords(coords, note, self.tuning)
         self.coords = coords[1:]
         self.root = coords[0]
 
         self.notes = None
         self.spelling = None
+        self.mask = 0
         self.chord = None
         self.coords_matrix = None
         self.find_notes()
@@ -155,11 +250,12 @@ class ChordShape(Chord):
     def getRoot(self):
         return self.root
     
-    def process_coords(coords, note = None):
+    def process_coords(coords, note = None, tuning = None):
         """
-        Returns correctly formatted guitar fret coordinates in the following format: 
+        Returns correctly formatted fret coordinates in the following format: 
         [root string # (1-6), String 1 fret # (1- ), String 2, 3, 4, 5, 6]
-        0 represents an unplayed string. 
+        0 represents an unplayed string. Instruments with other string counts (see Tuning) 
+        have one fret # per string.
 
         This method takes a list of coordinates or a string or integer representation of coordinates,
         validates the input, and returns a list of coordinates with the root note added if not given.
@@ -168,32 +264,37 @@ class ChordShape(Chord):
         Parameters:
         coords (list or str or int): The input coordinates.
         note (int, optional): The note to find the root based on. Defaults to None.
+        tuning (Tuning or str, optional): The tuning the coordinates are on. Defaults to standard.
 
         Returns:
         list: The processed coordinates.
         """
         
-        #Convert to list if not already
-        if type(coords) is not list:
-            if type(coords) is str and coords.isdigit():
-                coords = [int(digit) for digit in coords]
-            elif type(coords) is int:
-                coords = [int(digit) for digit in str(coords)]
-            else:
-                return ChordShape.empty_chord
+        base_notes = get_tuning(tuning).base_notes
+        strings = len(base_notes)
+        empty_chord = [0] * (strings + 1)
+
+        #Convert to list if not already, always a new list so the caller's coords are never changed
+        if type(coords) is list or type(coords) is tuple:
+            coords = list(coords)
+        elif type(coords) is str and coords.isdigit():
+            coords = [int(digit) for digit in coords]
+        elif type(coords) is int:
+            coords = [int(digit) for digit in str(coords)]
+        else:
+            return empty_chord
             
         #Check if valid input
-        if(7 < len(coords) < 6 or (len(coords) == 7 and 6 < coords[0] < 1)):
-            return ChordShape.empty_chord
+        if len(coords) not in (strings, strings + 1) or (len(coords) == strings + 1 and not 0 <= coords[0] <= strings):
+            return empty_chord
 
         #Add 0 for root note if not given
-        if len(coords) == 6:
+        if len(coords) == strings:
             coords = [0] + coords
 
         #convert note (str) to int 
         if(note is not None and type(note) is str):
-            note_values = music_data.note_values
-            note = next((i for i, row in enumerate(note_values) if note in row), None)
+            note = music_data.note_to_integer.get(note)
         #find root note based on given note
         # or transpose the shape to the given note if both root and note are given
         if(note is not None and type(note) is int and 0 <= note < 12):
@@ -201,7 +302,7 @@ class ChordShape(Chord):
                 
                 curr_root_note = (coords[coords[0]] + base_notes[coords[0] - 1] - 1) % 12
                 # if note = 4 & curr_root_note = 9, dist = 7, so curr_root_note + dist % 12 = 4
-                dist = (note - curr_root_note - 1) % 12
+                dist = (note - curr_root_note) % 12
                 for i in range(1, len(coords)):
                     if coords[i] != 0:
                         coords[i] += dist
@@ -212,16 +313,16 @@ class ChordShape(Chord):
                         break
                 
             if coords[0] == 0:
-                return ChordShape.empty_chord
+                return empty_chord
         #if no root or note given, find the root based on the first non-zero coordinate TODO
         if coords[0] == 0:
             coords[0] = next((i for i, coord in enumerate(coords) if coord != 0), None)
-        #standard input: 7 digits long list, 1st digit is root string, rest are fret numbers
+        #standard input: 7 digits long list (strings + 1), 1st digit is root string, rest are fret numbers
         return coords
 
     def find_notes(self):
         #Find the absolute notes of the shape
-        self.notes = [(base_note + coord - 1) % 12 if coord != 0 else None for base_note, coord in zip(base_notes, self.coords)]
+        self.notes = [(base_note + coord - 1) % 12 if coord != 0 else None for base_note, coord in zip(self.tuning.base_notes, self.coords)]
 
     def find_spelling(self): #TODO
         spelling = set()
@@ -235,25 +336,24 @@ class ChordShape(Chord):
             if note is not None:
                 spelling.add((note - root_note) % 12)
         self.spelling = spelling
+        self.mask = music_data.spelling_to_mask(spelling)
         self.match_chord()
     
     def coords_to_2D(self):
         min_fret = min(coord - 1 for coord in self.coords if coord != 0)
         max_fret = max(coord - 1 for coord in self.coords if coord != 0)
-        self.coords_matrix = [[None for _ in range(6)] for _ in range(max_fret  + 2)] #- min_fret
+        self.coords_matrix = [[None for _ in range(len(self.coords))] for _ in range(max_fret  + 2)] #- min_fret
         for i in range(len(self.coords)):
             if self.coords[i] != 0:  
                 self.coords_matrix[self.coords[i] ][i] = self.notes[i] #- min_fret
                 #self.coords[i] = self.coords[i] - min_fret
         
     def match_chord(self):
-        if self.chord is None:
-            for chord in all_chords:
-                if set(chord.integer_spelling) == self.spelling:
-                    self.chord = chord
-                    return
+        if self.chord is None and self.mask in chords_by_mask:
+            self.chord = chords_by_mask[self.mask]
+            return
             
-        self.chord = Chord("None", music_data.convert_spelling(self.spelling, 1), self.spelling) #TODO how to name chord?
+        self.chord = Chord(name_mask(self.mask).name, music_data.convert_spelling(self.spelling, 1), self.spelling)
 
     def print_diagram(self, type = 0):
         self.diagram.print_diagram(type)
@@ -265,6 +365,7 @@ class Scale():
     Attributes:
         name (str): Name of the scale.
         integer_spelling (list of int): Integer representation of the scale.
+        mask (int): 12-bit pitch-class mask of the integer spelling.
         coords (list of lists): Coordinates of the scale on a fretboard.
         diagrams (list of Diagram): Diagrams representing the scale on a fretboard.
         notes (list): Notes in the scale.
@@ -278,13 +379,15 @@ class Scale():
         print_diagram: Prints a specific diagram of the scale.
     """
 
-    def __init__(self, name = None, integer_spelling = None):
+    def __init__(self, name = None, integer_spelling = None, tuning = None):
         self.name = name
+        self.tuning = get_tuning(tuning)
         self.integer_spelling = integer_spelling
         if not name and tuple(integer_spelling) in music_data.scale_map_invert:
             self.name = music_data.scale_map_invert[tuple(self.integer_spelling)]
         if not integer_spelling and name in music_data.scale_map:
             self.integer_spelling = list(music_data.scale_map[name.strip()])
+        self.mask = music_data.spelling_to_mask(self.integer_spelling) if self.integer_spelling is not None else 0
 
         '''
         self.coords has been changed from a 3d array generated by create_coords to a
@@ -293,13 +396,27 @@ class Scale():
         '''
         self.coords = self.diagram = None
         if(self.integer_spelling is not None):
-            self.coords = Scale.create_coords2(self.integer_spelling)
+            if list(self.integer_spelling) == sorted(set(self.integer_spelling)):
+                # create_coords2 draws the scale on the lowest string's note, read the same grid from the cache
+                self.coords = get_scale_fretboards(self.tuning).coords(self.mask, self.tuning.base_notes[0])
+            else:
+                self.coords = Scale.create_coords2(self.integer_spelling, self.tuning.base_notes)
             self.diagram = Diagram(self.coords)
         #self.diagrams = Scale.create_diagrams(self.integer_spelling)
         self.notes = []
         self.chords = []
 
 
+    @staticmethod
+    def from_mask(mask, tuning = None):
+        """
+        Creates a Scale from a 12-bit pitch-class mask, named if it is in scale_map.
+        """
+        return Scale(music_data.scale_map_by_mask.get(mask), list(music_data.mask_to_spelling(mask)), tuning)
+
+    def get_mask(self):
+        return self.mask
+
     def __repr__(self):
         return f"Scale(name={self.name}, integer_spelling={self.integer_spelling})"
     
@@ -312,7 +429,7 @@ class Scale():
             print("root note" + str(root) + ": " + str(root_note))
             queue = deque(sorted([(n + root_note) % 12 for n in integer_spelling]))
             print("queue: ")
-            pprint.pprint(queue)
+            print(list(queue))
             
             scale_note = None
             for string in range(6):
@@ -338,13 +455,13 @@ class Scale():
         return coords
     
     @staticmethod
-    def create_coords2(integer_spelling):
+    def create_coords2(integer_spelling, base_notes = base_notes):
         num_frets = 16
-        coords = [[None for _ in range(6)] for _ in range(num_frets)]
-        base_notes2 = [note - 7 for note in base_notes]
+        coords = [[None for _ in range(len(base_notes))] for _ in range(num_frets)]
+        base_notes2 = [note - base_notes[0] for note in base_notes]
         queue = deque(integer_spelling)
         curr_note = queue.popleft()
-        for string in range(6):
+        for string in range(len(base_notes)):
             min_diff = min([(note - base_notes2[string]) % 12 for note in integer_spelling])
             while (curr_note - base_notes2[string]) % 12 != min_diff:
                 queue.append(curr_note)
@@ -401,6 +518,98 @@ class Scale():
         for i in range(5):
             print()
 
+class ScaleFretboards:
+    """
+    Fretboard note grids for every scale in scale_map in all 12 keys, computed once.
+
+    Each (scale, key) grid is num_frets x len(base_notes) bytes in one bytearray: the scale 
+    degree (0-11) played at each fret and string, or empty (255). Scales that share a spelling 
+    share a grid.
+    Spellings not in scale_map get their own bytearray, so the shared one is never resized 
+    while views returned by grid are alive.
+
+    Methods:
+        grid: The raw grid bytes for a scale (name, spelling or mask) and key (note or 0-11).
+        coords: The grid as a 2D list like Scale.create_coords2, None where not in the scale.
+        diagram: A Diagram of the grid.
+        build_all: Computes every grid up front.
+    """
+    num_frets = 16
+    empty = 255
+
+    def __init__(self, base_notes = base_notes):
+        self.base_notes = tuple(base_notes)
+        self.grid_size = self.num_frets * len(self.base_notes)
+        self.masks = sorted(music_data.scale_map_by_mask)
+        self.slots = {mask: i for i, mask in enumerate(self.masks)}
+        self.grids = bytearray(len(self.masks) * 12 * self.grid_size)
+        self.built = bytearray(len(self.masks) * 12)
+        self.extra = {} # mask -> (grids, built) for spellings not in scale_map
+
+    @staticmethod
+    def scale_mask(scale):
+        if isinstance(scale, int):
+            return scale
+        if isinstance(scale, str):
+            return music_data.spelling_to_mask(music_data.scale_map[scale.strip()])
+        return music_data.spelling_to_mask(scale)
+
+    def grid(self, scale, key = 0):
+        """
+        Returns the grid for a scale (name, integer spelling or mask) in a key (note name or 
+        A = 0 integer) as a memoryview of num_frets rows of one byte per string.
+        """
+        mask = self.scale_mask(scale)
+        if isinstance(key, str):
+            key = music_data.note_to_integer[key]
+        key %= 12
+        if mask in self.slots:
+            grids, built, slot = self.grids, self.built, self.slots[mask] * 12 + key
+        else:
+            # not in scale_map, kept in its own arrays
+            if mask not in self.extra:
+                self.extra[mask] = (bytearray(12 * self.grid_size), bytearray(12))
+            (grids, built), slot = self.extra[mask], key
+        start = slot * self.grid_size
+        if not built[slot]:
+            self.fill(grids, mask, key, start)
+            built[slot] = 1
+        return memoryview(grids)[start:start + self.grid_size]
+
+    def fill(self, grids, mask, key, start):
+        strings = len(self.base_notes)
+        for fret in range(self.num_frets):
+            for string, base_note in enumerate(self.base_notes):
+                degree = (base_note + fret - key) % 12
+                grids[start + fret * strings + string] = degree if mask >> degree & 1 else self.empty
+
+    def coords(self, scale, key = 0):
+        grid, strings = self.grid(scale, key), len(self.base_notes)
+        return [[cell_values[cell] for cell in grid[row:row + strings]] 
+                for row in range(0, self.grid_size, strings)]
+
+    def diagram(self, scale, key = 0):
+        return Diagram(self.coords(scale, key))
+
+    def build_all(self):
+        for mask in self.masks + list(self.extra):
+            for key in range(12):
+                self.grid(mask, key)
+        return self
+
+
+# grid byte -> coords value
+cell_values = list(range(12)) + [None] * 244
+def get_scale_fretboards(tuning = None):
+    # shared ScaleFretboards for a tuning, standard by default
+    return scale_fretboards(get_tuning(tuning).base_notes)
+
+@functools.lru_cache(maxsize=16)
+def scale_fretboards(base_notes):
+    # the most recently used tunings' grids, custom tunings come from query strings
+    return ScaleFretboards(base_notes)
+
+
 class Diagram: #TODO
     """
     Represents a diagram of a scale or chord shape on a guitar fretboard.
@@ -441,10 +650,12 @@ class Diagram: #TODO
                     notes.append(self.coords[i][j])
                     if self.root != 0 and j + 1 == self.root:
                         self.root_note = self.coords[i][j]
+        if self.root == 0:
+            self.root_note = 0 # scale diagrams hold tones relative to the scale root
         self.ordered_notes = notes
         
     def set_diagram(self, type = 0, top_fret = None):
-        self.diagram = [["|" for _ in range(6)] for _ in range(self.num_frets + 2)]
+        self.diagram = [["|" for _ in range(len(self.coords[0]))] for _ in range(self.num_frets + 2)]
         for i in range(0, len(self.coords[0])):
             column = [row[i] for row in self.coords]
             if all(coord is None for coord in column):
@@ -475,34 +686,313 @@ class Diagram: #TODO
 
     def print_diagram(self, type = 0, top_fret = None):
         self.set_diagram(type, top_fret)
-        fret_numbers = (0, 3, 5, 7, 9, 12, 15, 17, 19, 21, 24)
-
-        for i in range(len(self.diagram) ):
-            row = self.diagram[i]
-            row_num = str(i + self.min_fret - 1) if i + self.min_fret - 1 in fret_numbers else ""
-            print(" ".join(str(element).ljust(self.max_width) for element in row) + " " + row_num)
+        for row in self.rows(" "):
+            print(row)
 
         #find the minimum j for which diagram[i][j] is not None and assign it to min_fret
 
+    def rows(self, sep = "  "):
+        # the current diagram as text rows, with fret numbers on the right
+        return render_rows(self.diagram, self.min_fret, self.max_width, sep)
+
     def convert_fret(self, note, type):
         note = (note - self.root_note) % 12
         if type == 1:
             return note
         if type == 2:
             return music_data.integer_to_tones[note]
-        if any(type in row for row in music_data.note_values): #type in music_data.note_values
-            index = next((i for i, row in enumerate(music_data.note_values) if type in row), None)            
+        if type in music_data.note_to_integer:
+            index = music_data.note_to_integer[type]
             return music_data.note_values[(index + note) % 12][0]
         return 'O'
 
 
+def render_rows(diagram, min_fret, max_width, sep = "  "):
+    fret_numbers = (0, 3, 5, 7, 9, 12, 15, 17, 19, 21, 24)
+    rows = []
+    for i in range(len(diagram)):
+        row_num = str(i + min_fret - 1) if i + min_fret - 1 in fret_numbers else ""
+        rows.append(sep.join(str(element).ljust(max_width) for element in diagram[i]) + " " + row_num)
+    return rows
+
+
+class CompactChord(namedtuple('CompactChord', ['name', 'mask'])):
+    """
+    Slotted, immutable variant of Chord: a name and a spelling mask, spellings derived on demand.
+    """
+    __slots__ = ()
+
+    @property
+    def integer_spelling(self):
+        if self.mask in music_data.chord_map_by_mask:
+            return music_data.chord_map_by_mask[self.mask][1]
+        return music_data.mask_to_spelling(self.mask)
+
+    @property
+    def standard_spelling(self):
+        return music_data.convert_spelling(self.integer_spelling, 1)
+
+    def __repr__(self):
+        return f"Chord(name='{self.name}', standard_spelling='{self.standard_spelling}', integer_spelling='{self.integer_spelling}')"
+
+
+class CompactDiagram(namedtuple('CompactDiagram', ['coords', 'root', 'tuning'], defaults=(standard_tuning,))):
+    """
+    Slotted, immutable variant of Diagram for chord shapes. Holds only the shape's coords 
+    tuple, root string and tuning; the grid is built when it is rendered.
+
+    Methods:
+        grid: Builds the diagram grid, same as Diagram.diagram.
+        rows: Renders the grid as text rows, same as Diagram.rows.
+        print_diagram: Prints the diagram.
+    """
+    __slots__ = ()
+    fret_numbers = (0, 3, 5, 7, 9, 12, 15, 17, 19, 21, 24)
+
+    @property
+    def min_fret(self):
+        return min(coord for coord in self.coords if coord != 0)
+
+    @property
+    def max_fret(self):
+        return max(self.coords)
+
+    @property
+    def diagram(self):
+        return self.grid()
+
+    def grid(self, type = 0):
+        notes = [(base_note + coord - 1) % 12 if coord != 0 else None for base_note, coord in zip(self.tuning.base_notes, self.coords)]
+        root_note = notes[self.root - 1]
+        min_fret, max_fret = self.min_fret, self.max_fret
+        grid = [['x' if coord == 0 else '|' for coord in self.coords]]
+        grid += [["|"] * len(self.coords) for _ in range(max_fret - min_fret + 2)]
+        for string, coord in enumerate(self.coords):
+            if coord != 0:
+                note = (notes[string] - root_note) % 12
+                cell = 'O'
+                if type == 1:
+                    cell = note
+                elif type == 2:
+                    cell = music_data.integer_to_tones[note]
+                elif type in music_data.note_to_integer:
+                    cell = music_data.note_values[(music_data.note_to_integer[type] + note) % 12][0]
+                elif type == 0 and note == 0:
+                    cell = '0'
+                grid[coord - min_fret + 1][string] = cell
+        return grid
+
+    def rows(self, sep = "  ", type = 0):
+        grid = self.grid(type)
+        return render_rows(grid, self.min_fret, max(len(str(element)) for row in grid for element in row), sep)
+
+    def print_diagram(self, type = 0):
+        for row in self.rows(" ", type):
+            print(row)
+
+
+class CompactChordShape(namedtuple('CompactChordShape', ['root', 'coords', 'tuning'], defaults=(standard_tuning,))):
+    """
+    Slotted, immutable variant of ChordShape: the root string, a tuple of frets (same 
+    format as ChordShape.coords) and the tuning. Notes, spelling, chord and diagram are 
+    derived on demand.
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def from_coords(coords, note = None, tuning = None):
+        tuning = get_tuning(tuning)
+        coords = ChordShape.process_coords(coords, note, tuning)
+        return CompactChordShape(coords[0], tuple(coords[1:]), tuning)
+
+    @staticmethod
+    def from_shape(shape):
+        return CompactChordShape(shape.root, tuple(shape.coords), shape.tuning)
+
+    @property
+    def notes(self):
+        return tuple((base_note + coord - 1) % 12 if coord != 0 else None for base_note, coord in zip(self.tuning.base_notes, self.coords))
+
+    @property
+    def mask(self):
+        notes = self.notes
+        root_note = notes[self.root - 1]
+        return music_data.spelling_to_mask((note - root_note) % 12 for note in notes if note is not None)
+
+    @property
+    def spelling(self):
+        return set(music_data.mask_to_spelling(self.mask))
+
+    @property
+    def chord(self):
+        return compact_chord(self.mask)
+
+    @property
+    def diagram(self):
+        return CompactDiagram(self.coords, self.root, self.tuning)
+
+    def print_diagram(self, type = 0):
+        self.diagram.print_diagram(type)
+
+    def __repr__(self):
+        chord = self.chord
+        return f"ChordShape(name='{chord.name}', standard_spelling='{chord.standard_spelling}', integer_spelling='{chord.integer_spelling}', root='{self.root}', coords='{list(self.coords)}')"
+
+
+class ShapeTemplate(namedtuple('ShapeTemplate', ['root', 'offsets', 'tuning'], defaults=(standard_tuning,))):
+    """
+    Root-independent chord shape: the root string and each string's fret relative to the 
+    root string's fret (None for muted strings). Templates are shared (see shape_template), 
+    one instance serves all 12 roots; place puts it on the neck as a PlacedShape.
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def from_coords(coords, tuning = None):
+        # shared template of ChordShape format coords, None if the root string is not played
+        coords = ChordShape.process_coords(coords, None, tuning)
+        root = coords[0]
+        if not root or not coords[root]:
+            return None
+        offsets = tuple(coord - coords[root] if coord != 0 else None for coord in coords[1:])
+        return shape_template(root, offsets, get_tuning(tuning).base_notes)
+
+    @property
+    def mask(self):
+        return template_mask(self)
+
+    def root_fret(self, note, low = 1):
+        # lowest root string coord (1 = open) >= low that plays note (str or A = 0 int)
+        if isinstance(note, str):
+            note = music_data.note_to_integer[note]
+        open_note = self.tuning.base_notes[self.root - 1]
+        return low + (note - (open_note + low - 1)) % 12
+
+    def fits(self, fret, neck_frets = 24):
+        # whether the shape placed with its root string on coord fret is on the neck
+        played = [offset for offset in self.offsets if offset is not None]
+        return fret + min(played) >= 1 and fret + max(played) - 1 <= neck_frets
+
+    def place(self, fret):
+        return PlacedShape(self, fret)
+
+
+@functools.lru_cache(maxsize=None)
+def shape_template(root, offsets, base_notes = standard_tuning.base_notes):
+    # one shared ShapeTemplate per distinct shape, wherever on the neck its coords were
+    return ShapeTemplate(root, offsets, tuning_for_notes(base_notes))
+
+@functools.lru_cache(maxsize=None)
+def template_mask(template):
+    # spelling mask of a template, the same on every root
+    base_notes = template.tuning.base_notes
+    root_note = base_notes[template.root - 1]
+    return music_data.spelling_to_mask(base_note + offset - root_note for base_note, offset in zip(base_notes, template.offsets) if offset is not None)
+
+
+class PlacedShape(namedtuple('PlacedShape', ['shape', 'fret'])):
+    """
+    A ShapeTemplate on the neck with its root string on coord fret (1 = open). Has the same 
+    properties as CompactChordShape, all derived from the shared template on demand.
+    """
+    __slots__ = ()
+
+    @property
+    def root(self):
+        return self.shape.root
+
+    @property
+    def tuning(self):
+        return self.shape.tuning
+
+    @property
+    def coords(self):
+        return tuple(self.fret + offset if offset is not None else 0 for offset in self.shape.offsets)
+
+    @property
+    def mask(self):
+        return self.shape.mask
+
+    notes = CompactChordShape.notes
+    spelling = CompactChordShape.spelling
+    chord = CompactChordShape.chord
+    diagram = CompactChordShape.diagram
+    print_diagram = CompactChordShape.print_diagram
+    __repr__ = CompactChordShape.__repr__
+
+
+@functools.lru_cache(maxsize=None)
+def compact_chord(mask):
+    # one shared CompactChord per spelling, named like ChordShape.match_chord names it
+    chord = chords_by_mask.get(mask)
+    return CompactChord(chord.name if chord else name_mask(mask).name, mask)
+
+
 all_chords = []
 for chord_name, chord_data in music_data.chord_map.items():
     chord = Chord(chord_name, chord_data[0], chord_data[1])
     all_chords.append(chord)
 
-chord_shapes = []
-for coords in music_data.chord_shapes:
-    shape = ChordShape(coords)
-    chord_shapes.append(shape)
+# mask -> first chord in all_chords with that spelling
+chords_by_mask = {}
+for chord in all_chords:
+    chords_by_mask.setdefault(chord.mask, chord)
+
+ChordName = namedtuple('ChordName', ['name', 'aliases', 'roots', 'scale'])
+ChordName.__doc__ = """
+Everything known about one pitch-class set, relative to a reference note (the root string):
+    name (str): Best name - the chord_map name, else the first names_to_spellings name, else 
+                an inversion like 'major/3' (chord root above the reference, reference below 
+                it as a tone), else the scale name, else 'None'.
+    aliases (tuple of str): Every names_to_spellings name for this exact spelling.
+    roots (tuple): (semitones from the reference up to the root, name) for each note of the 
+                   set that roots a known chord, reference first.
+    scale (str): scale_map name with this spelling, or None.
+"""
+
+# mask -> ChordName for all 4096 pitch-class sets, see build_chord_names
+chord_names = None
+
+def build_chord_names():
+    global chord_names
+    known = {}
+    aliases = {}
+    for entry in music_data.names_to_spellings['chords']:
+        mask = music_data.spelling_to_mask(entry['spelling'])
+        names = aliases.setdefault(mask, [])
+        names.extend(name for name in entry['names'] if name and name not in names)
+        if names:
+            known.setdefault(mask, names[0])
+    # chord_map names win over the scraped names
+    known.update((mask, chord.name) for mask, chord in chords_by_mask.items())
+
+    names = []
+    for mask in range(music_data.all_tones_mask + 1):
+        roots = []
+        for root in music_data.mask_to_spelling(mask):
+            rooted = music_data.transpose_mask(mask, -root)
+            if rooted in known:
+                bass = '/' + music_data.integer_to_tones[-root % 12] if root else ''
+                roots.append((root, known[rooted] + bass))
+        scale = music_data.scale_map_by_mask.get(mask)
+        name = roots[0][1] if roots else scale or "None"
+        names.append(ChordName(name, tuple(aliases.get(mask, ())), tuple(roots), scale))
+    chord_names = names
+    compact_chord.cache_clear()
+    return chord_names
+
+def name_mask(mask):
+    """
+    Returns the ChordName for a 12-bit spelling mask relative to a reference note.
+    """
+    if chord_names is None:
+        build_chord_names()
+    return chord_names[mask & music_data.all_tones_mask]
+
+def __getattr__(name):
+    # chord_shapes is only built when first used
+    if name == 'chord_shapes':
+        globals()['chord_shapes'] = [ChordShape(list(coords)) for coords in music_data.chord_shapes]
+        return globals()['chord_shapes']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
@@ -1,13 +1,17 @@
 
 import os
 import json
+import time
 import pprint
+import threading
+from collections import OrderedDict
 from sqlalchemy import *
 from sqlalchemy.pool import NullPool
-from flask import Flask, request, render_template, g, redirect, Response, session
+from flask import Flask, request, render_template, g, redirect, Response, session, jsonify, has_request_context, stream_with_context
 from werkzeug.security import check_password_hash, generate_password_hash
 
 import music_methods as mm
+import song_search
 
 tmpl_dir = os.path.join(os.path.dirname(
     os.path.abspath(__file__)), 'templates')
@@ -17,26 +21,178 @@ app.config.from_mapping(
     SECRET_KEY='dev',
 )
 
+# chord diagrams are served from the precomputed voicing table (built on first run)
+mm.load_voicing_table()
+
 DATABASE_USERNAME = ""
 DATABASE_PASSWRD = ""
 DATABASE_HOST = ""
-DATABASEURI = f"postgresql://{DATABASE_USERNAME}:{DATABASE_PASSWRD}@{DATABASE_HOST}/"
-
-
-engine = create_engine(DATABASEURI)
-
-conn = engine.connect()
-
-
-@app.before_request
-def before_request():
-    try:
+DATABASEURI = os.environ.get('DATABASE_URL', f"postgresql://{DATABASE_USERNAME}:{DATABASE_PASSWRD}@{DATABASE_HOST}/")
+
+# connection pool, sized per worker with the DB_POOL_* environment variables
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+
+engine = create_engine(DATABASEURI, pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT, 
+                       pool_recycle=POOL_RECYCLE, pool_pre_ping=POOL_PRE_PING)
+
+# checkout counts and time spent waiting for a pooled connection, see /pool_stats
+pool_stats = {'checkouts': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+pool_stats_lock = threading.Lock()
+
+
+def get_db():
+    """
+    The request's database connection, checked out of the pool the first time a handler 
+    needs it and returned to the pool at teardown. Requests that never touch the database 
+    never check one out.
+    """
+    if 'conn' not in g:
+        start = time.perf_counter()
         g.conn = engine.connect()
-    except:
-        print("uh oh, problem connecting to database")
-        import traceback
-        traceback.print_exc()
-        g.conn = None
+        wait = time.perf_counter() - start
+        with pool_stats_lock:
+            pool_stats['checkouts'] += 1
+            pool_stats['wait_total'] += wait
+            pool_stats['wait_max'] = max(pool_stats['wait_max'], wait)
+    return g.conn
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    # queries run by the current request, sent back in the X-Query-Count header
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+@app.after_request
+def add_query_count(response):
+    # only for tests and debugging, see test_server.py
+    if app.testing or app.debug:
+        response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+    return response
+
+
+# user_id -> (expiry time, user row, playlist rows), least recently used first. Entries expire 
+# after USER_CACHE_TTL seconds and are dropped by writes to the user's playlists or favorites.
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 30))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+user_cache = OrderedDict()
+user_cache_lock = threading.Lock()
+
+
+def get_user_context(user_id):
+    # the user row and playlists, from the cache or the database
+    now = time.monotonic()
+    with user_cache_lock:
+        entry = user_cache.get(user_id)
+        if entry is not None and entry[0] > now:
+            user_cache.move_to_end(user_id)
+            return entry[1], entry[2]
+
+    user = get_db().execute(text("SELECT * FROM \"User\" WHERE user_id = :user_id"), {'user_id': user_id}).fetchone()
+    playlists = tuple(get_db().execute(text("SELECT * FROM playlist where user_id = :user_id"), {'user_id': user_id}).fetchall())
+    with user_cache_lock:
+        user_cache[user_id] = (now + USER_CACHE_TTL, user, playlists)
+        user_cache.move_to_end(user_id)
+        while len(user_cache) > USER_CACHE_SIZE:
+            user_cache.popitem(last=False)
+    return user, playlists
+
+
+def invalidate_user(user_id):
+    with user_cache_lock:
+        user_cache.pop(user_id, None)
+
+
+# title/artist search index, loaded from the database on the first search and synced with the 
+# song table at most every SONG_INDEX_REFRESH seconds, picking up added, renamed and deleted songs
+SONG_INDEX_REFRESH = float(os.environ.get('SONG_INDEX_REFRESH', 60))
+SEARCH_LIMIT = int(os.environ.get('SEARCH_LIMIT', 50))
+song_index = song_search.SongIndex()
+song_index_state = {'loaded': False, 'refreshed': 0.0}
+song_index_lock = threading.Lock()
+
+
+def refresh_song_index(force = False):
+    now = time.monotonic()
+    if not force and song_index_state['loaded'] and now - song_index_state['refreshed'] < SONG_INDEX_REFRESH:
+        return song_index
+    # once loaded, searches don't wait on another request's refresh
+    if not song_index_lock.acquire(blocking=force or not song_index_state['loaded']):
+        return song_index
+    try:
+        # only songs whose title or artist changed are indexed again, the scan is streamed
+        query = text("SELECT s.song_id, s.title, a.name FROM song s LEFT JOIN Artist a ON a.artist_id = s.artist_id")
+        rows = get_db().execution_options(stream_results=True, yield_per=SONG_STREAM_BATCH).execute(query)
+        song_index.sync(tuple(row) for row in rows)
+        song_index_state.update(loaded=True, refreshed=now)
+    finally:
+        song_index_lock.release()
+    return song_index
+
+
+def search_songs(query, limit = SEARCH_LIMIT):
+    # song rows matching query, best match first
+    ranked = [song_id for _, song_id in refresh_song_index().search(query, limit)]
+    if not ranked:
+        return []
+    songs_query = text("SELECT * FROM song WHERE song_id IN :song_ids").bindparams(bindparam('song_ids', expanding=True))
+    songs = {song.song_id: song for song in get_db().execute(songs_query, {'song_ids': ranked})}
+    return [songs[song_id] for song_id in ranked if song_id in songs]
+
+
+# song listings page through (title, song_id) with keyset pagination and select only the 
+# columns the list view shows, never the long description
+SONG_PAGE_SIZE = int(os.environ.get('SONG_PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 500))
+SONG_STREAM_BATCH = int(os.environ.get('SONG_STREAM_BATCH', 500))
+SONG_LIST_COLUMNS = "song_id, title, key, rhythm, time_signature, artist_id"
+
+
+def song_list_query(after = None, limit = None):
+    # songs after the (title, song_id) cursor in title order
+    query = f"SELECT {SONG_LIST_COLUMNS} FROM song"
+    params = {}
+    if after is not None:
+        query += " WHERE (title, song_id) > (:after_title, :after_id)"
+        params = {'after_title': after[0], 'after_id': after[1]}
+    query += " ORDER BY title, song_id"
+    if limit is not None:
+        query += " LIMIT :limit"
+        params['limit'] = limit
+    return text(query), params
+
+
+def get_limit(value, default, maximum = MAX_PAGE_SIZE):
+    # a ?limit= from 1 to maximum, ValueError (a 400) otherwise
+    limit = default if value is None else int(value)
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}")
+    return limit
+
+
+def get_cursor(args):
+    # the (title, song_id) to continue after from ?after_title=&after_id=, None for the start
+    if 'after_id' not in args:
+        return None
+    return args.get('after_title', ''), int(args['after_id'])
+
+
+def get_song_page(after = None, limit = SONG_PAGE_SIZE):
+    """
+    One page of songs in title order and the cursor of the next page, None on the last page.
+    """
+    query, params = song_list_query(after, limit + 1)
+    songs = get_db().execute(query, params).fetchall()
+    next_page = None
+    if len(songs) > limit:
+        songs = songs[:limit]
+        next_page = {'after_title': songs[-1].title, 'after_id': songs[-1].song_id}
+    return songs, next_page
 
 
 @app.before_request
@@ -47,18 +203,31 @@ def load_logged_in_user():
         g.user = None
         g.playlists = None
     else:
-        g.user = g.conn.execute(text("SELECT * FROM \"User\" WHERE user_id = :user_id"), {'user_id': user_id}).fetchone()
-        g.playlists = g.conn.execute(text("SELECT * FROM playlist where user_id = :user_id"), {'user_id': user_id}).fetchall()
+        g.user, g.playlists = get_user_context(user_id)
 
 
 
 
 @app.teardown_request
 def teardown_request(exception):
-    try:
-        g.conn.close()
-    except Exception as e:
-        pass
+    conn = g.pop('conn', None)
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"An error occurred returning the connection: {e}")
+
+
+@app.route('/pool_stats')
+def pool_stats_view():
+    # pool occupancy and checkout wait times, for sizing workers against the database
+    with pool_stats_lock:
+        stats = dict(pool_stats)
+    stats['wait_avg'] = stats['wait_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+    stats.update({'size': engine.pool.size(), 'checked_out': engine.pool.checkedout(), 
+                  'checked_in': engine.pool.checkedin(), 'overflow': engine.pool.overflow(), 
+                  'max_overflow': POOL_MAX_OVERFLOW, 'timeout': POOL_TIMEOUT})
+    return jsonify(stats)
 
 #
 @app.route('/')
@@ -94,48 +263,106 @@ def songsearch():
     name = request.form['name']
     print('name', name)
     name = name.lower().strip()
-    params = {"new_name": name}
 
     try:
-        songs = g.conn.execute(
-            text('SELECT * FROM song WHERE LOWER(title) = :new_name'), params).fetchall()
+        # prefix, substring and typo tolerant matches on title and artist, see song_search.py
+        # an empty search lists the first page of songs, /browse has the rest
         if name == "":
-            songs = g.conn.execute(
-                text('SELECT * FROM song'), params).fetchall()
+            return browse()
+        songs = search_songs(name, get_limit(request.form.get('limit'), SEARCH_LIMIT))
         
         if g.user:
-            playlists = g.conn.execute(text("SELECT * FROM playlist where user_id = :user_id"), {'user_id': session.get('id')}).fetchall()
-            context = {'user': g.user, 'songs': songs, 'playlists': playlists }
+            context = {'user': g.user, 'songs': songs, 'playlists': g.playlists }
 
         else:
             context = {'songs': songs}
         return render_template('index.html', **context)
 
+    except ValueError as e:
+        return str(e), 400
     except Exception as e:
         print(f"An error occurred fetching songs: {e}")
         return redirect('/')
 
+@app.route('/search', methods=['GET'])
+def search():
+    # ranked matches for ?q=, e.g. /search?q=stairway%20heavn&limit=10, for autocomplete
+    try:
+        limit = get_limit(request.args.get('limit'), SEARCH_LIMIT)
+        index = refresh_song_index()
+        results = []
+        for score, song_id in index.search(request.args.get('q', ''), limit):
+            title, artist = index.songs[song_id][:2]
+            results.append({'song_id': song_id, 'title': title, 'artist': artist, 'score': round(score, 3)})
+        return jsonify(results)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/browse', methods=['GET'])
+def browse():
+    # every song in title order, a page at a time: /browse?after_title=Help&after_id=3
+    try:
+        songs, next_page = get_song_page(get_cursor(request.args), get_limit(request.args.get('limit'), SONG_PAGE_SIZE))
+        context = {'user': g.user, 'songs': songs, 'playlists': g.playlists, 'next_page': next_page}
+        return render_template('index.html', **context)
+    except ValueError as e:
+        return str(e), 400
+    except Exception as e:
+        print(f"An error occurred listing songs: {e}")
+        return redirect('/')
+
+
+@app.route('/songs', methods=['GET'])
+def songs_page():
+    # one page of songs as JSON, pass next back as ?after_title=&after_id= for the next page
+    try:
+        songs, next_page = get_song_page(get_cursor(request.args), get_limit(request.args.get('limit'), SONG_PAGE_SIZE))
+        return jsonify({'songs': [song._asdict() for song in songs], 'next': next_page})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/songs/stream', methods=['GET'])
+def songs_stream():
+    # every song (after the optional cursor) as newline delimited JSON, read from a server-side 
+    # cursor SONG_STREAM_BATCH rows at a time so memory stays flat however big the catalog is
+    try:
+        query, params = song_list_query(get_cursor(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        result = get_db().execution_options(stream_results=True, yield_per=SONG_STREAM_BATCH).execute(query, params)
+        for song in result:
+            yield json.dumps(song._asdict()) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @app.route('/songview/<song_id>', methods=['GET'])
 def songview(song_id): 
     
     try:
         transpose = int(request.args.get('transpose', 0))
-        cursor = g.conn.execute(text("SELECT * FROM song WHERE song_id = :song_id"), {'song_id': song_id})
+        # ?voice_leading=1 picks voicings that move the hand least from chord to chord
+        voice_leading = request.args.get('voice_leading') == '1'
+        # ?tuning=drop D (a preset name or notes like DADGAD), standard by default
+        tuning = request.args.get('tuning') or None
+        cursor = get_db().execute(text("SELECT * FROM song WHERE song_id = :song_id"), {'song_id': song_id})
         song = cursor.fetchone()
-        cursor = g.conn.execute(text("SELECT chord_name FROM chord NATURAL JOIN songchord WHERE song_id = :song_id"), {'song_id': song_id})
-        chords = cursor.fetchall()
-        transposed_chords = []
+        cursor = get_db().execute(text("SELECT chord_name FROM chord NATURAL JOIN songchord WHERE song_id = :song_id"), {'song_id': song_id})
+        chords = [c[0] for c in cursor.fetchall()]
 
-        for c in chords: 
-            transposed_chords.append( mm.md.transpose_chord(c[0], transpose) )
-        new_key = mm.md.transpose_chord(song[5], transpose)
+        # transpose the chords and the key together
+        *transposed_chords, new_key = mm.md.transpose_chart(chords + [song[5]], transpose)
 
-        diagrams = mm.get_chord_diagrams(transposed_chords, '0-5')
+        diagrams = mm.get_chord_diagrams(transposed_chords, '0-5', voice_leading, tuning=tuning)
 
-        artist = g.conn.execute(text("SELECT * FROM Artist WHERE artist_id = :artist_id"), {'artist_id': song[1]}).fetchone()
+        artist = get_db().execute(text("SELECT * FROM Artist WHERE artist_id = :artist_id"), {'artist_id': song[1]}).fetchone()
         if song:
             print(song)
-            context = {'song': song , 'chords': transposed_chords, 'diagrams': diagrams, 'transpose': transpose, 'key': new_key, 'artist': artist, 'description': song[7]}
+            context = {'song': song , 'chords': transposed_chords, 'diagrams': diagrams, 'transpose': transpose, 'voice_leading': voice_leading, 'tuning': tuning, 'key': new_key, 'artist': artist, 'description': song[7]}
             return render_template('songview.html', **context)
         else:
             return redirect('/')
@@ -144,20 +371,110 @@ def songview(song_id):
         return redirect('/')
 
 
+@app.route('/songview/<song_id>/transpositions', methods=['GET'])
+def songview_transpositions(song_id): 
+    # every key at once, so the client can transpose without reloading the page
+    try:
+        song = get_db().execute(text("SELECT * FROM song WHERE song_id = :song_id"), {'song_id': song_id}).fetchone()
+        if song is None:
+            return jsonify({'error': 'song not found'}), 404
+        cursor = get_db().execute(text("SELECT chord_name FROM chord NATURAL JOIN songchord WHERE song_id = :song_id"), {'song_id': song_id})
+        chords = [c[0] for c in cursor.fetchall()]
+
+        charts = mm.md.transpose_chart_all(chords + [song[5]])
+        return jsonify([{'transpose': steps, 'key': chart[-1], 'chords': chart[:-1]} for steps, chart in enumerate(charts)])
+    except Exception as e:
+        print(f"An error occurred transposing the song: {e}")
+        return jsonify({'error': 'could not transpose song'}), 500
+
+
+@app.route('/songview/<song_id>/capo', methods=['GET'])
+def songview_capo(song_id): 
+    # all 12 capo positions for the song's chords, easiest to play first
+    try:
+        song = get_db().execute(text("SELECT * FROM song WHERE song_id = :song_id"), {'song_id': song_id}).fetchone()
+        if song is None:
+            return jsonify({'error': 'song not found'}), 404
+        cursor = get_db().execute(text("SELECT chord_name FROM chord NATURAL JOIN songchord WHERE song_id = :song_id"), {'song_id': song_id})
+        chords = [c[0] for c in cursor.fetchall()]
+
+        positions = mm.find_capo_positions(chords)
+        for position in positions:
+            # the key the shapes are played in
+            position['key'] = mm.md.transpose_chord(song[5], -position['capo']) if song[5] else None
+        return jsonify(positions)
+    except Exception as e:
+        print(f"An error occurred finding capo positions: {e}")
+        return jsonify({'error': 'could not rank capo positions'}), 500
+
+
+@app.route('/scales', methods=['GET'])
+def scales(): 
+    # scales containing ?notes=C,E,G or the notes of ?chord=Am7, fewest extra notes first
+    try:
+        limit = get_limit(request.args.get('limit'), 50)
+        chord = request.args.get('chord')
+        if chord:
+            matches = mm.find_scales_for_chord(chord, limit)
+            if matches is None:
+                return jsonify({'error': f'chord {chord} not found'}), 404
+        else:
+            notes = [note.strip() for note in request.args.get('notes', '').split(',') if note.strip()]
+            matches = mm.find_scales_containing(notes, limit)
+        return jsonify(matches)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/name_voicing', methods=['GET'])
+def name_voicing(): 
+    # names ?frets=x,3,2,0,1,0 (lowest string first, x = muted), optional ?root_string=1-6 and ?tuning=
+    try:
+        tuning = mm.mo.get_tuning(request.args.get('tuning') or None)
+        frets = [fret.strip() for fret in request.args.get('frets', '').split(',')]
+        if len(frets) != tuning.strings:
+            return jsonify({'error': f'frets needs {tuning.strings} comma separated values'}), 400
+        coords = [int(request.args.get('root_string', 0))] + [0 if fret.lower() == 'x' else int(fret) + 1 for fret in frets]
+        voicing = mm.name_voicing(coords, tuning=tuning)
+        if voicing is None:
+            return jsonify({'error': 'the root string is not played'}), 400
+        return jsonify(voicing)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+def get_playlist_songs(user_id, playlists):
+    # songs of every playlist of the user in one query, grouped by playlist name
+    playlist_songs = {playlist[0]: [] for playlist in playlists}
+    if not playlists:
+        return playlist_songs
+    songs = get_db().execute(text(
+        "SELECT s.*, c.name AS playlist_name FROM Song s JOIN contains c ON s.song_id = c.song_id "
+        "WHERE c.name IN (SELECT name FROM playlist WHERE user_id = :user_id)"),
+        {'user_id': user_id}).fetchall()
+    for song in songs:
+        playlist_songs.setdefault(song.playlist_name, []).append(song)
+    return playlist_songs
+
+
+def get_artists(artist_ids):
+    # the distinct artists with the given ids in one query
+    artist_ids = list(dict.fromkeys(artist_ids))
+    if not artist_ids:
+        return []
+    query = text("SELECT * FROM Artist WHERE artist_id IN :artist_ids").bindparams(bindparam('artist_ids', expanding=True))
+    return get_db().execute(query, {'artist_ids': artist_ids}).fetchall()
+
+
 @app.route('/profile')
 def profile():
     user_id = session.get('id')
 
-    playlists = g.conn.execute(text("SELECT * FROM playlist where user_id = :user_id"), {'user_id': session.get('id')}).fetchall()
-    playlist_songs = {}
+    playlists = g.playlists or ()
     fav_artists_query = text("SELECT name FROM Artist a WHERE a.artist_id IN (SELECT artist_id FROM fav_artist WHERE user_id = :user_id)")
-    fav_artists = g.conn.execute(fav_artists_query, {'user_id': user_id}).fetchall()
+    fav_artists = get_db().execute(fav_artists_query, {'user_id': user_id}).fetchall()
 
-    for playlist in playlists:
-        songs = g.conn.execute(text(
-            "SELECT s.* FROM Song s JOIN contains c ON s.song_id = c.song_id WHERE c.name = :name"),
-            {'name': playlist[0]}).fetchall()
-        playlist_songs[playlist[0]] = songs
+    playlist_songs = get_playlist_songs(user_id, playlists)
 
     context = {'user': g.user, 'fav_artists': fav_artists, 'playlists': playlists, 'playlist_songs': playlist_songs}
     return render_template('profile.html', **context)
@@ -165,6 +482,7 @@ def profile():
 
 @app.route('/logout')
 def logout():
+    invalidate_user(session.get('id'))
     session.clear()
     return redirect('/')
 
@@ -185,7 +503,7 @@ def loginUser():
         name = request.form['uname']
         password = request.form['pwd']
         try:
-            result = g.conn.execute(
+            result = get_db().execute(
                 text("SELECT * FROM \"User\" WHERE name = :name"), {'name': name})
             print(result.keys())
             user = result.fetchone()
@@ -212,8 +530,9 @@ def add_favorite(artist_id):
     song_id = request.args.get('song_id')
     user_id = session.get('id')
     try:
-        g.conn.execute(text("INSERT INTO fav_artist (user_id, artist_id) VALUES (:user_id, :artist_id)"), {'user_id': user_id, 'artist_id': artist_id})
-        #g.conn.commit()
+        get_db().execute(text("INSERT INTO fav_artist (user_id, artist_id) VALUES (:user_id, :artist_id)"), {'user_id': user_id, 'artist_id': artist_id})
+        invalidate_user(user_id)
+        #get_db().commit()
         print(f"inserted artist_id {artist_id} for user_id {user_id}")
         return redirect('/songview/' + song_id)
     except Exception as e:
@@ -230,9 +549,9 @@ def joinUser():
     params["genre"] = json.dumps([request.form['genre']])
 
     try:
-        g.conn.execute(text(
+        get_db().execute(text(
             "INSERT INTO \"User\" (name, password, age, favorite_keys, favorite_genres) VALUES (:name, :password, :age, :key, :genre)"), params)
-        g.conn.commit()
+        get_db().commit()
         return redirect('/login')
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -246,41 +565,30 @@ def recs():
     print('id', id)
 
     try:
-        user_query = text("SELECT favorite_keys, favorite_genres FROM \"User\" WHERE user_id = :user_id")
-        user_prefs = g.conn.execute(user_query, {'user_id': user_id}).fetchone()
-        print("user_prefs", user_prefs[0][0], user_prefs[1][0])
-
-        if user_prefs is None:
+        if g.user is None:
             print("User not found.")
             return redirect('/login')
+        user_prefs = (g.user.favorite_keys, g.user.favorite_genres)
+        print("user_prefs", user_prefs[0][0], user_prefs[1][0])
         
         fav_artists_query = text("SELECT name FROM Artist a WHERE a.artist_id IN (SELECT artist_id FROM fav_artist WHERE user_id = :user_id)")
-        fav_artists = g.conn.execute(fav_artists_query, {'user_id': user_id}).fetchall()
+        fav_artists = get_db().execute(fav_artists_query, {'user_id': user_id}).fetchall()
 
         songs_query = text("SELECT * FROM Song s WHERE artist_id IN (SELECT artist_id FROM fav_artist WHERE user_id = :user_id) OR ( key = :key AND rhythm = :genre)")
-        songs = g.conn.execute(songs_query, {'user_id': user_id,'key': user_prefs[0][0], 'genre': user_prefs[1][0]}).fetchall()
+        songs = get_db().execute(songs_query, {'user_id': user_id,'key': user_prefs[0][0], 'genre': user_prefs[1][0]}).fetchall()
         
         if not songs:
-            songs_key = g.conn.execute(text("SELECT * FROM Song WHERE key = :key"), {'key': user_prefs[0][0]}).fetchall()
-            songs_genre = g.conn.execute(text("SELECT * FROM Song WHERE rhythm = :genre"), {'genre': user_prefs[1][0]}).fetchall()
+            songs_key = get_db().execute(text("SELECT * FROM Song WHERE key = :key"), {'key': user_prefs[0][0]}).fetchall()
+            songs_genre = get_db().execute(text("SELECT * FROM Song WHERE rhythm = :genre"), {'genre': user_prefs[1][0]}).fetchall()
             songs = songs_key if songs_key else songs_genre 
         
         if not songs:
-            songs = g.conn.execute(text("SELECT * FROM \"Song\" ORDER BY RANDOM() LIMIT 10")).fetchall()
+            songs = get_db().execute(text("SELECT * FROM \"Song\" ORDER BY RANDOM() LIMIT 10")).fetchall()
         
-        artists = []
-        for song in songs:
-            artist = g.conn.execute(text("SELECT * FROM Artist WHERE artist_id = :artist_id"), {'artist_id': song[1]}).fetchone()
-            artists.append(artist)
-
-        playlists = g.conn.execute(text("SELECT * FROM playlist where user_id = :user_id"), {'user_id': session.get('id')}).fetchall()
-        playlist_songs = {}
+        artists = get_artists(song[1] for song in songs)
 
-        for playlist in playlists:
-            mySongs = g.conn.execute(text(
-                "SELECT s.* FROM Song s JOIN contains c ON s.song_id = c.song_id WHERE c.name = :name"),
-                {'name': playlist[0]}).fetchall()
-            playlist_songs[playlist[0]] = mySongs
+        playlists = g.playlists or ()
+        playlist_songs = get_playlist_songs(user_id, playlists)
 
         context = {'user': g.user, 'fav_artists':  fav_artists, 'playlists': playlists, 'playlist_songs': playlist_songs, 'songs': songs, 'artists': artists}
         
@@ -300,9 +608,10 @@ def playlist():
     print(params["name"], params["user_id"], params["description"])
 
     try:
-        g.conn.execute(text(
+        get_db().execute(text(
             "INSERT INTO playlist (name, user_id, description) VALUES (:name, :user_id, :description)"), params)
-        g.conn.commit()
+        get_db().commit()
+        invalidate_user(params["user_id"])
         return redirect('/profile')
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -317,9 +626,10 @@ def addSong():
     params["song_id"] = request.form['song_id']
 
     try:
-        g.conn.execute(text(
+        get_db().execute(text(
             "INSERT INTO contains (name, song_id) VALUES (:name, :song_id)"), params)
-        g.conn.commit()
+        get_db().commit()
+        invalidate_user(session.get('id'))
         return redirect('/')
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -355,4 +665,4 @@ if __name__ == "__main__":
         print("running on %s:%d" % (HOST, PORT))
         app.run(host=HOST, port=PORT, debug=debug, threaded=threaded)
 
-run()
+    run()
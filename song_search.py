@@ -0,0 +1,253 @@
+import re
+import heapq
+import bisect
+import threading
+import unicodedata
+from itertools import islice
+from collections import Counter
+
+"""
+File Name: song_search.py
+Description: In-process inverted index for searching songs by title and artist. Matches whole
+             words, word prefixes, substrings inside words and words one or two typos away, and
+             ranks the results. Lookups go through the vocabulary (distinct words), not the
+             songs, so search time grows with the number of matching songs rather than the
+             size of the catalog. Songs are added, updated and removed one at a time.
+"""
+
+word_pattern = re.compile(r"\w+")
+
+# scores for how a query word matched a song word, title matches beat artist matches
+EXACT, PREFIX, SUBSTRING, FUZZY = 1.0, 0.8, 0.6, 0.5
+ARTIST_WEIGHT = 0.75
+# shortest query word expanded to the words it starts. Songs of exact, prefix and substring 
+# word matches are always scored, but short (under 3 letter) prefixes and typos can match a 
+# large part of the catalog, so each query word adds at most MAX_CANDIDATES songs through 
+# those, and at most MAX_CANDIDATES titles starting with the query are added.
+MIN_PREFIX = 2
+MAX_CANDIDATES = 1000
+
+
+def normalize(text):
+    # casefolded words without accents or punctuation in any script, "Don't Stop!" -> 
+    # ['dont', 'stop'], "Désafinado" -> ['desafinado']
+    text = unicodedata.normalize('NFKD', (text or "").casefold().replace("'", "").replace("\u2019", ""))
+    return word_pattern.findall("".join(char for char in text if not unicodedata.combining(char)))
+
+
+def trigrams(word, pad = True):
+    # padded trigrams mark the word's start and end, "$$h", "$he", ..., "lp$", "p$$"
+    if pad:
+        word = "$$" + word + "$$"
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance with adjacent transpositions between a and b, or limit + 1 as soon as
+    it is known to be larger than limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+
+def typo_limit(word):
+    # typos allowed in a query word, none for very short words
+    return 0 if len(word) < 4 else 1 if len(word) < 8 else 2
+
+
+class SongIndex:
+    """
+    Inverted index from words to the songs whose title or artist contains them.
+
+    Methods:
+        add: Indexes a song, replacing any earlier version with the same id.
+        remove: Drops a song from the index.
+        sync: Adds, updates and removes songs to match a full list of them.
+        search: Ranked (score, song_id) pairs for a query.
+    """
+
+    def __init__(self):
+        self.songs = {}      # song_id -> (title, artist, title words, artist words, normalized title)
+        self.postings = {}   # word -> set of song_ids
+        self.grams = {}      # trigram -> set of words, for substring and typo matching
+        self.vocabulary = [] # sorted words, for prefix matching
+        self.titles = []     # sorted (normalized title, song_id), for whole title prefixes
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.songs)
+
+    def __contains__(self, song_id):
+        return song_id in self.songs
+
+    def add(self, song_id, title, artist = None):
+        title_phrase = " ".join(normalize(title))
+        title_words, artist_words = frozenset(title_phrase.split()), frozenset(normalize(artist))
+        with self.lock:
+            self.remove(song_id)
+            self.songs[song_id] = (title or "", artist or "", title_words, artist_words, title_phrase)
+            bisect.insort(self.titles, (title_phrase, song_id))
+            for word in title_words | artist_words:
+                if word not in self.postings:
+                    self.postings[word] = set()
+                    bisect.insort(self.vocabulary, word)
+                    for gram in trigrams(word):
+                        self.grams.setdefault(gram, set()).add(word)
+                self.postings[word].add(song_id)
+
+    def remove(self, song_id):
+        with self.lock:
+            song = self.songs.pop(song_id, None)
+            if song is None:
+                return
+            del self.titles[bisect.bisect_left(self.titles, (song[4], song_id))]
+            for word in song[2] | song[3]:
+                self.postings[word].discard(song_id)
+                if not self.postings[word]:
+                    # last song with this word, drop it from the vocabulary
+                    del self.postings[word]
+                    del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+                    for gram in trigrams(word):
+                        self.grams[gram].discard(word)
+                        if not self.grams[gram]:
+                            del self.grams[gram]
+
+    def sync(self, rows):
+        """
+        Makes the index match rows of (song_id, title, artist), e.g. a scan of the whole song 
+        table: new and changed songs are indexed again and songs not in rows are removed. 
+        Unchanged songs are only compared, not tokenized again.
+
+        Returns:
+            tuple: (songs added or changed, songs removed)
+        """
+        seen, changed = set(), 0
+        for song_id, title, artist in rows:
+            seen.add(song_id)
+            song = self.songs.get(song_id)
+            if song is None or song[:2] != (title or "", artist or ""):
+                self.add(song_id, title, artist)
+                changed += 1
+        with self.lock:
+            removed = [song_id for song_id in self.songs if song_id not in seen]
+            for song_id in removed:
+                self.remove(song_id)
+        return changed, len(removed)
+
+    def match_words(self, query_word):
+        """
+        Vocabulary words matching query_word and how well they match, as {word: score}.
+        """
+        matches = {}
+        if query_word in self.postings:
+            matches[query_word] = EXACT
+
+        # prefixes: the run of the sorted vocabulary starting with query_word
+        i = bisect.bisect_left(self.vocabulary, query_word) if len(query_word) >= MIN_PREFIX else len(self.vocabulary)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(query_word):
+            matches.setdefault(self.vocabulary[i], PREFIX)
+            i += 1
+
+        if len(query_word) >= 3:
+            # substrings: words containing every unpadded trigram of query_word
+            grams = sorted((self.grams.get(gram, frozenset()) for gram in trigrams(query_word, pad=False)), key=len)
+            for word in grams[0].intersection(*grams[1:]) if grams else ():
+                if query_word in word:
+                    matches.setdefault(word, SUBSTRING)
+
+        limit = typo_limit(query_word)
+        if limit:
+            # typos: an edit changes at most 4 padded trigrams (transpositions), so a close
+            # enough word shares at least len(grams) - 4 * limit of them
+            grams = trigrams(query_word)
+            shared = Counter(word for gram in grams for word in self.grams.get(gram, ()))
+            needed = max(1, len(grams) - 4 * limit)
+            for word, count in shared.items():
+                if count >= needed and word not in matches:
+                    distance = edit_distance(query_word, word, limit)
+                    if distance <= limit:
+                        matches[word] = FUZZY - 0.1 * (distance - 1)
+        return matches
+
+    def word_songs(self, query_word, matches):
+        """
+        Songs matching one query word given its match_words matches: every song of its exact, 
+        prefix and substring matches, and at most MAX_CANDIDATES through short prefixes and 
+        typos, best matching words first.
+        """
+        songs, expanded = set(), set()
+        for word, score in sorted(matches.items(), key=lambda item: (-item[1], len(self.postings[item[0]]))):
+            if score == EXACT or score == SUBSTRING or (score == PREFIX and len(query_word) >= 3):
+                songs |= self.postings[word]
+            elif len(expanded) < MAX_CANDIDATES:
+                expanded.update(islice(self.postings[word], MAX_CANDIDATES - len(expanded)))
+        return songs | expanded
+
+    def title_songs(self, phrase):
+        # songs whose normalized title starts with phrase, whole title matches first
+        songs = []
+        i = bisect.bisect_left(self.titles, (phrase,))
+        while i < len(self.titles) and len(songs) < MAX_CANDIDATES and self.titles[i][0].startswith(phrase):
+            songs.append(self.titles[i][1])
+            i += 1
+        return songs
+
+    def search(self, query, limit = 20):
+        """
+        Songs matching every word of query in their title or artist, best first.
+
+        Parameters:
+            query (str): The search text, e.g. "stairway heavn" or "zeppelin".
+            limit (int): The most results to return.
+
+        Returns:
+            list of (float, song_id): Scores and ids, highest score first.
+        """
+        query_words = list(dict.fromkeys(normalize(query)))
+        if not query_words:
+            return []
+        phrase = " ".join(query_words)
+
+        with self.lock:
+            matches = [self.match_words(word) for word in query_words]
+            # songs matching every query word, intersected smallest first, and the titles 
+            # starting with the whole query even when its last word is too short to expand
+            songs = sorted((self.word_songs(word, words) for word, words in zip(query_words, matches)), key=len)
+            candidates = songs[0].intersection(*songs[1:])
+            candidates.update(self.title_songs(phrase))
+
+            results = []
+            for song_id in candidates:
+                title, artist, title_words, artist_words, title_phrase = self.songs[song_id]
+                title_prefix = title_phrase.startswith(phrase)
+                score = 0.0
+                for words in matches:
+                    best = max([words.get(word, 0) for word in title_words] +
+                               [words.get(word, 0) * ARTIST_WEIGHT for word in artist_words])
+                    if not best and title_prefix:
+                        # the last word of "love m" only matches as part of the title prefix
+                        best = PREFIX
+                    if not best:
+                        break
+                    score += best
+                else:
+                    # whole title matches and title prefixes rank first
+                    if title_phrase == phrase:
+                        score += 2
+                    elif title_prefix:
+                        score += 1
+                    results.append((score, -len(title), song_id))
+
+        return [(score, song_id) for score, _, song_id in heapq.nlargest(limit, results)]
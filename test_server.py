@@ -0,0 +1,89 @@
+import os
+import tempfile
+import pytest
+
+# server connects at import, point it at a throwaway sqlite database first
+db_path = os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+
+import server
+from sqlalchemy import text
+
+"""
+File Name: test_server.py
+Description: Checks that the profile and recommendation pages run a fixed number of queries
+             however many playlists the user has, and that the search index follows changes
+             to the song table. Run with `python -m pytest test_server.py`.
+"""
+
+schema = [
+    'CREATE TABLE "User"(user_id INTEGER PRIMARY KEY, name TEXT, age INT, favorite_keys TEXT, favorite_genres TEXT, password TEXT)',
+    'CREATE TABLE playlist(name TEXT, user_id INT, description TEXT)',
+    'CREATE TABLE Artist(artist_id INTEGER PRIMARY KEY, name TEXT)',
+    'CREATE TABLE song(song_id INTEGER PRIMARY KEY, artist_id INT, title TEXT, rhythm TEXT, time_signature TEXT, key TEXT, x TEXT, description TEXT)',
+    'CREATE TABLE contains(name TEXT, song_id INT)',
+    'CREATE TABLE fav_artist(user_id INT, artist_id INT)',
+]
+
+
+@pytest.fixture(scope='module')
+def client():
+    with server.engine.begin() as conn:
+        for statement in schema:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO \"User\" VALUES (1, 'test', 30, 'C', 'rock', '')"))
+        for artist_id in (1, 2, 3):
+            conn.execute(text("INSERT INTO Artist VALUES (:id, :name)"), {'id': artist_id, 'name': f"artist {artist_id}"})
+        for song_id in range(1, 11):
+            conn.execute(text("INSERT INTO song VALUES (:id, :artist_id, :title, 'rock', '4/4', 'C', '', '')"),
+                         {'id': song_id, 'artist_id': song_id % 3 + 1, 'title': f"song {song_id}"})
+        conn.execute(text("INSERT INTO fav_artist VALUES (1, 1), (1, 2)"))
+
+    server.app.testing = True
+    client = server.app.test_client()
+    with client.session_transaction() as session:
+        session['id'] = 1
+    return client
+
+
+def add_playlists(count):
+    # count more playlists of the user, each with three songs
+    with server.engine.begin() as conn:
+        start = conn.execute(text("SELECT COUNT(*) FROM playlist")).scalar()
+        for i in range(start, start + count):
+            conn.execute(text("INSERT INTO playlist VALUES (:name, 1, '')"), {'name': f"playlist {i}"})
+            for song_id in range(i % 10 + 1, i % 10 + 4):
+                conn.execute(text("INSERT INTO contains VALUES (:name, :song_id)"), {'name': f"playlist {i}", 'song_id': song_id})
+    server.invalidate_user(1)
+
+
+def query_count(response):
+    assert response.status_code == 200
+    return int(response.headers['X-Query-Count'])
+
+
+@pytest.mark.parametrize('method, url', [('get', '/profile'), ('post', '/recs')])
+def test_query_count_independent_of_playlists(client, method, url):
+    counts = []
+    for added in (1, 4, 20):
+        add_playlists(added)
+        counts.append(query_count(getattr(client, method)(url)))
+    assert len(set(counts)) == 1, counts
+
+
+def test_user_context_cached(client):
+    # the user row and playlists are loaded once, then served from the cache
+    add_playlists(1)
+    first = query_count(client.get('/profile'))
+    assert query_count(client.get('/profile')) == first - 2
+
+
+def test_search_index_follows_song_changes(client):
+    assert [song['song_id'] for song in client.get('/search?q=song 3').json][:1] == [3]
+    with server.engine.begin() as conn:
+        conn.execute(text("UPDATE song SET title = 'renamed tune' WHERE song_id = 3"))
+        conn.execute(text("DELETE FROM song WHERE song_id = 4"))
+    with server.app.test_request_context():
+        server.refresh_song_index(force=True)
+    assert [song['song_id'] for song in client.get('/search?q=renamed').json] == [3]
+    assert 4 not in [song['song_id'] for song in client.get('/search?q=song').json]
@@ -0,0 +1,63 @@
+import song_search
+
+"""
+File Name: test_song_search.py
+Description: Ranking and matching checks for song_search.SongIndex, including catalogs with more
+             songs per query word than MAX_CANDIDATES. Run with `python -m pytest test_song_search.py`.
+"""
+
+
+def make_index(titles):
+    index = song_search.SongIndex()
+    for song_id, title in enumerate(titles):
+        index.add(song_id, title)
+    return index
+
+
+def test_all_query_words_checked_before_capping():
+    titles = [f"love song {i}" for i in range(3000)] + [f"me and you {i}" for i in range(3000)] + ["Love Me Do"]
+    index = make_index(titles)
+    assert [song_id for _, song_id in index.search('love me')] == [len(titles) - 1]
+
+
+def test_whole_title_match_ranks_first_among_many():
+    titles = [f"my love {i}" for i in range(5000)] + ["Love"]
+    index = make_index(titles)
+    results = index.search('love', 3)
+    assert results[0] == (3.0, len(titles) - 1)
+
+
+def test_partial_last_word():
+    index = make_index([f"love song {i}" for i in range(3000)] + ["Love Me Do"])
+    assert index.search('love m', 1)[0][1] == 3000
+
+
+def test_prefix_substring_and_typo():
+    index = make_index(["Stairway to Heaven", "Help!", "Yellow"])
+    assert index.search('stairway heavn')[0][1] == 0
+    assert index.search('hlep')[0][1] == 1
+    assert index.search('ello')[0][1] == 2
+
+
+def test_accents_and_other_scripts():
+    index = make_index(["Désafinado", "Группа крови"])
+    assert index.search('desafinado')[0][1] == 0
+    assert index.search('désaf')[0][1] == 0
+    assert index.search('крови')[0][1] == 1
+
+
+def test_update_and_remove():
+    index = make_index(["Yesterday"])
+    index.add(0, "Tomorrow")
+    assert index.search('yesterday') == []
+    assert index.search('tomorrow')[0][1] == 0
+    index.remove(0)
+    assert index.search('tomorrow') == [] and not index.titles and not index.vocabulary
+
+
+def test_sync_renames_and_removes():
+    index = make_index(["Yesterday", "Help!", "Yellow"])
+    assert index.sync([(0, "Yesterday", None), (1, "Help Me Rhonda", None)]) == (1, 1)
+    assert index.search('yellow') == []
+    assert index.search('rhonda')[0][1] == 1
+    assert index.sync([(0, "Yesterday", None), (1, "Help Me Rhonda", None)]) == (0, 0)
@@ -0,0 +1,165 @@
+import os
+import sys
+import mmap
+import struct
+import bisect
+import hashlib
+from array import array
+import music_data as md
+import music_methods as mm
+
+"""
+File Name: voicing_table.py
+Description: Precomputes every (generic shape, root) voicing - coords, min/max fret, spelling
+             mask and rendered diagram rows - into a compact binary file that the web app
+             memory-maps at startup. Build it with `python voicing_table.py [path]`.
+
+File layout (little endian), one column per field so each can be viewed as an array:
+    header      magic, version, record count, blob size, 8 byte hash of generic_shapes3.json
+    offsets     uint32 x n   start of each record's rows in the blob
+    masks       uint16 x n   spelling mask
+    row_sizes   uint16 x n   length of each record's rows in the blob
+    roots       uint8 x n    root note (A = 0)
+    min_frets   uint8 x n
+    max_frets   uint8 x n
+    coords      uint8 x 7n   [root string, fret 1, ..., fret 6] per record
+    blob        utf-8 diagram rows joined by newlines
+Records are sorted by (mask, root, min_fret, max_fret), the same ranking as mm.find_voicings.
+"""
+
+MAGIC = b'VOIC'
+VERSION = 2
+HEADER = struct.Struct('<4sIII8s')
+COORDS_WIDTH = 7
+
+# VOICING_TABLE points the table somewhere writable when the checkout is read-only
+default_path = os.environ.get('VOICING_TABLE') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'voicings.bin')
+shapes_path = os.path.join(md.data_dir, md.data_files['generic_shapes'])
+
+
+def source_hash():
+    with open(shapes_path, 'rb') as file:
+        return hashlib.sha1(file.read()).digest()[:8]
+
+
+def build_table(path = default_path):
+    """
+    Precomputes every voicing for every spelling in the generic shapes on all 12 roots and
+    writes the table to path. Returns the number of records written.
+    """
+    if mm.shape_index is None:
+        mm.build_shape_index()
+
+    offsets, masks, row_sizes = array('I'), array('H'), array('H')
+    roots, min_frets, max_frets, coords = array('B'), array('B'), array('B'), array('B')
+    blob = bytearray()
+    for mask in sorted(mm.shape_index):
+        spelling = md.mask_to_spelling(mask)
+        for root in range(12):
+            for shape in mm.find_voicings(spelling, root)[2]:
+                rows = "\n".join(mm.diagram_rows(shape.diagram)).encode('utf-8')
+                offsets.append(len(blob))
+                row_sizes.append(len(rows))
+                blob += rows
+                masks.append(mask)
+                roots.append(root)
+                min_frets.append(shape.diagram.min_fret)
+                max_frets.append(shape.diagram.max_fret)
+                coords.extend([shape.root] + list(shape.coords))
+
+    columns = (offsets, masks, row_sizes, roots, min_frets, max_frets, coords)
+    if sys.byteorder != 'little':
+        for column in columns:
+            column.byteswap()
+    # write beside the old table and swap it in, so a table that is already mapped stays valid
+    with open(path + '.tmp', 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(masks), len(blob), source_hash()))
+        for column in columns:
+            column.tofile(file)
+        file.write(blob)
+    os.replace(path + '.tmp', path)
+    return len(masks)
+
+
+class VoicingTable:
+    """
+    Read-only, memory-mapped view of a table written by build_table.
+
+    Methods:
+        find_in_range: Index of the best ranked voicing within a fret range, or None.
+        find_all_in_range: Indexes of every voicing within a fret range, best first.
+        count: Number of voicings for a spelling mask and root.
+        rows: Rendered diagram rows of a record.
+        get_coords: [root string, fret 1, ..., fret 6] of a record.
+    """
+
+    def __init__(self, path = default_path):
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, blob_size, self.source_hash = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} voicing table")
+        if sys.byteorder != 'little':
+            raise ValueError("voicing tables can only be memory-mapped on little endian machines")
+
+        view = memoryview(self.buffer)
+        n, pos = self.size, HEADER.size
+        columns = []
+        for fmt, width in (('I', 4), ('H', 2), ('H', 2), ('B', 1), ('B', 1), ('B', 1), ('B', COORDS_WIDTH)):
+            columns.append(view[pos:pos + n * width].cast(fmt))
+            pos += n * width
+        self.offsets, self.masks, self.row_sizes, self.roots, self.min_frets, self.max_frets, self.coords = columns
+        self.blob = view[pos:pos + blob_size]
+
+        # (mask, root) -> [start, end) of its records
+        self.ranges = {}
+        for i in range(n):
+            key = (self.masks[i], self.roots[i])
+            start = self.ranges.get(key, (i, i))[0]
+            self.ranges[key] = (start, i + 1)
+
+    def count(self, mask, root):
+        start, end = self.ranges.get((mask, root), (0, 0))
+        return end - start
+
+    def find_all_in_range(self, mask, root, fret_range = None):
+        # indexes of the voicings within fret_range, best ranked first
+        start, end = self.ranges.get((mask, root), (0, 0))
+        low, high = fret_range if fret_range else (-1, 1000)
+        for i in range(bisect.bisect_left(self.min_frets, low, start, end), end):
+            if self.min_frets[i] > high:
+                break
+            if self.max_frets[i] <= high:
+                yield i
+
+    def find_in_range(self, mask, root, fret_range = None):
+        return next(self.find_all_in_range(mask, root, fret_range), None)
+
+    def rows(self, i):
+        offset = self.offsets[i]
+        return bytes(self.blob[offset:offset + self.row_sizes[i]]).decode('utf-8').split("\n")
+
+    def get_coords(self, i):
+        return list(self.coords[i * COORDS_WIDTH:(i + 1) * COORDS_WIDTH])
+
+
+def load_table(path = default_path):
+    """
+    Loads the table at path, building it first if it is missing, from an older version or
+    was built from a different generic_shapes3.json.
+    """
+    if os.path.exists(path):
+        try:
+            table = VoicingTable(path)
+        except ValueError:
+            # written by an older version, rebuild it
+            table = None
+        if table is not None and table.source_hash == source_hash():
+            return table
+    build_table(path)
+    return VoicingTable(path)
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else default_path
+    print(f"wrote {build_table(path)} voicings to {path}")